@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        if settings.INGREDIENT_INDEX_PRELOAD:
+            from .indexes import ingredient_index
+            ingredient_index.preload()
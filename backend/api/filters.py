@@ -1,11 +1,13 @@
+from django import forms
 from django_filters.rest_framework import FilterSet, filters
-from rest_framework.filters import SearchFilter
 
 from recipes.models import Recipe, Tag
 
 
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+class IntegerInFilter(filters.BaseInFilter, filters.NumberFilter):
+    """Список целых чисел через запятую; дробные значения не принимаются."""
+
+    field_class = forms.IntegerField
 
 
 class RecipeFilter(FilterSet):
@@ -23,19 +25,48 @@ class RecipeFilter(FilterSet):
         field_name='is_in_shopping_cart', method='get_is_in_shopping_cart'
     )
     author = filters.AllValuesMultipleFilter(field_name='author__id')
+    ingredients = IntegerInFilter(method='get_by_ingredients')
+    search = filters.CharFilter(method='get_search')
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('new', 'Сначала новые'),
+            ('popular', 'Больше всего в избранном'),
+            ('trending', 'Популярные сейчас'),
+        ),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
+        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'ingredients', 'search', 'ordering']
+
+    def get_by_ingredients(self, queryset, name, data):
+        """
+        Рецепты, которые можно приготовить из ингредиентов data, по
+        убыванию доли имеющихся ингредиентов рецепта.
+        """
+        return queryset.by_ingredients(data)
+
+    def get_search(self, queryset, name, data):
+        data = data.strip()
+        if not data:
+            return queryset
+        return queryset.search(data)
+
+    def get_ordering(self, queryset, name, data):
+        if data == 'popular':
+            return queryset.order_by('-favorites_count', '-pub_date')
+        if data == 'trending':
+            return queryset.order_by('-trending_score', '-pub_date')
+        return queryset
 
     def get_is_favorited(self, queryset, name, data):
         if data and not self.request.user.is_anonymous:
-            return queryset.filter(favoriting__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, data):
         if data and not self.request.user.is_anonymous:
-            return queryset.filter(
-                shop_list__user=self.request.user
-            )
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
@@ -0,0 +1,122 @@
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from recipes import versions
+from recipes.models import Recipe
+from recipes.storage import recipe_image_storage
+
+from .workers import submit
+
+VARIANTS_DIR = 'recipes/variants'
+
+logger = logging.getLogger(__name__)
+
+
+def get_variant_name(image_name, size, extension):
+    """Путь к варианту изображения image_name в хранилище."""
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{VARIANTS_DIR}/{stem}_{size}.{extension}'
+
+
+def render_variants(image_name, sizes, formats, quality):
+    """
+    Уменьшенные копии изображения image_name для каждого размера из sizes
+    в каждом формате из formats: {(размер, расширение): bytes}.
+    Выполняется в фоновом процессе, там же читается файл изображения.
+    """
+    with recipe_image_storage.open(image_name, 'rb') as image:
+        data = image.read()
+    with Image.open(BytesIO(data)) as source:
+        source = ImageOps.exif_transpose(source)
+        variants = {}
+        for size, dimensions in sizes.items():
+            image = source.copy()
+            image.thumbnail(dimensions, Image.LANCZOS)
+            for extension, image_format in formats.items():
+                if image_format == 'JPEG' and image.mode != 'RGB':
+                    converted = image.convert('RGB')
+                elif image.mode not in ('RGB', 'RGBA'):
+                    converted = image.convert('RGBA')
+                else:
+                    converted = image
+                buffer = BytesIO()
+                converted.save(
+                    buffer, image_format, quality=quality, optimize=True
+                )
+                variants[size, extension] = buffer.getvalue()
+    return variants
+
+
+def get_render_args(image_name):
+    """Аргументы render_variants для изображения image_name."""
+    return (
+        image_name,
+        settings.RECIPE_IMAGE_SIZES,
+        settings.RECIPE_IMAGE_FORMATS,
+        settings.RECIPE_IMAGE_QUALITY,
+    )
+
+
+def save_variants(recipe_id, image_name, variants):
+    """
+    Сохраняет варианты в хранилище и отмечает их готовность, если
+    изображение рецепта за это время не сменилось.
+    """
+    for (size, extension), content in variants.items():
+        recipe_image_storage.replace(
+            get_variant_name(image_name, size, extension),
+            ContentFile(content),
+        )
+    updated = Recipe.objects.filter(
+        id=recipe_id, image=image_name
+    ).update(image_variants=image_name)
+    if updated:
+        versions.bump(
+            versions.model_name(Recipe), versions.recipe_name(recipe_id)
+        )
+    return bool(updated)
+
+
+def start_image_variants(recipe_id, image_name):
+    """Ставит построение вариантов изображения рецепта в фоновый пул."""
+
+    def on_success(variants):
+        save_variants(recipe_id, image_name, variants)
+
+    def on_error(error):
+        logger.error(
+            'Не удалось построить варианты изображения %s', image_name,
+            exc_info=error,
+        )
+
+    submit(
+        render_variants,
+        *get_render_args(image_name),
+        on_success=on_success,
+        on_error=on_error,
+    )
+
+
+def get_variant_urls(recipe, request=None):
+    """
+    Ссылки на варианты изображения рецепта по размерам и форматам или
+    None, пока варианты для текущего изображения не готовы.
+    """
+    if not recipe.image or recipe.image_variants != recipe.image.name:
+        return None
+    urls = {}
+    for size in settings.RECIPE_IMAGE_SIZES:
+        urls[size] = {}
+        for extension in settings.RECIPE_IMAGE_FORMATS:
+            url = recipe.image.storage.url(
+                get_variant_name(recipe.image.name, size, extension)
+            )
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[size][extension] = url
+    return urls
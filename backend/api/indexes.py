@@ -0,0 +1,165 @@
+import logging
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from recipes import versions
+from recipes.models import Ingredient
+
+logger = logging.getLogger(__name__)
+
+
+def edit_distance(first, second, limit):
+    """
+    Расстояние Дамерау-Левенштейна между строками; при превышении limit
+    возвращает limit + 1, не досчитывая матрицу до конца.
+    """
+    previous_row = None
+    row = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, start=1):
+        before_previous_row, previous_row, row = (
+            previous_row, row, [i] + [0] * len(second)
+        )
+        for j, second_char in enumerate(second, start=1):
+            row[j] = min(
+                previous_row[j] + 1,
+                row[j - 1] + 1,
+                previous_row[j - 1] + (first_char != second_char),
+            )
+            if (
+                i > 1 and j > 1
+                and first_char == second[j - 2]
+                and first[i - 2] == second_char
+            ):
+                row[j] = min(row[j], before_previous_row[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+class IngredientNameIndex:
+    """
+    Индекс названий ингредиентов в памяти процесса для автодополнения.
+    Сначала отдаются совпадения по началу названия, затем по подстроке,
+    затем названия с опечатками. Индекс строится при запуске процесса
+    (INGREDIENT_INDEX_PRELOAD) или при первом запросе и перестраивается при
+    смене версии модели Ingredient или по истечении INGREDIENT_INDEX_TTL
+    секунд.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._state = None
+
+    @staticmethod
+    def invalidate():
+        """Сбрасывает индекс во всех процессах после коммита."""
+        versions.bump(versions.model_name(Ingredient))
+
+    def _load(self):
+        entries = sorted(
+            (name.lower(), {
+                'id': pk, 'name': name, 'measurement_unit': unit
+            })
+            for pk, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        return entries, [key for key, _ in entries]
+
+    def _is_fresh(self, state, version):
+        return state is not None and state[2] == version and (
+            time.monotonic() - state[3] <= settings.INGREDIENT_INDEX_TTL
+        )
+
+    def preload(self):
+        """
+        Строит индекс заранее. Без базы или до миграций индекс будет
+        построен при первом запросе.
+        """
+        try:
+            self._get_entries()
+        except DatabaseError as error:
+            logger.warning('Индекс ингредиентов не построен: %s', error)
+
+    def _get_entries(self, version=None):
+        """
+        Названия и ключи поиска из одного снимка индекса: параллельная
+        перестройка заменяет снимок целиком и не затрагивает уже
+        выданный. Версию Ingredient, уже прочитанную вызывающим кодом,
+        можно передать в version, чтобы не запрашивать её снова.
+        """
+        if version is None:
+            [version] = versions.get_versions(
+                [versions.model_name(Ingredient)]
+            )
+        state = self._state
+        if not self._is_fresh(state, version):
+            with self._lock:
+                state = self._state
+                if not self._is_fresh(state, version):
+                    entries, keys = self._load()
+                    state = (entries, keys, version, time.monotonic())
+                    self._state = state
+        return state[0], state[1]
+
+    def search(self, query, limit, version=None):
+        query = query.strip().lower()
+        entries, keys = self._get_entries(version)
+        if not query:
+            return [ingredient for _, ingredient in entries[:limit]]
+        results = []
+        position = bisect_left(keys, query)
+        while (
+            position < len(keys)
+            and keys[position].startswith(query)
+            and len(results) < limit
+        ):
+            results.append(entries[position][1])
+            position += 1
+        if len(results) < limit:
+            substring_matches = sorted(
+                (key.find(query), key, ingredient)
+                for key, ingredient in entries
+                if query in key and not key.startswith(query)
+            )
+            results.extend(
+                ingredient
+                for _, _, ingredient in substring_matches[
+                    :limit - len(results)
+                ]
+            )
+        max_typos = 1 if len(query) < 6 else 2
+        if len(results) < limit and len(query) >= 3:
+            found = {ingredient['id'] for ingredient in results}
+            query_chars = set(query)
+            typo_matches = []
+            lengths = (len(query) - 1, len(query), len(query) + 1)
+            for key, ingredient in entries:
+                # Каждая правка теряет не больше одного символа запроса,
+                # а в самом длинном префиксе есть символы остальных.
+                if (
+                    len(query_chars.difference(key[:lengths[-1]]))
+                    > max_typos
+                    or ingredient['id'] in found
+                ):
+                    continue
+                # Пропуск или лишний символ меняют длину префикса.
+                distance = min(
+                    edit_distance(query, key[:length], max_typos)
+                    for length in lengths
+                )
+                if distance <= max_typos:
+                    typo_matches.append((distance, key, ingredient))
+            typo_matches.sort(key=lambda match: match[:2])
+            results.extend(
+                ingredient
+                for _, _, ingredient in typo_matches[:limit - len(results)]
+            )
+        return results
+
+
+ingredient_index = IngredientNameIndex()
@@ -0,0 +1,77 @@
+from hashlib import md5
+
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers
+)
+from django.utils.http import http_date, quote_etag
+
+from recipes import versions
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы для list и retrieve. ETag и Last-Modified
+    вычисляются по версиям моделей conditional_models одним запросом к
+    таблице версий, при совпадении с заголовками запроса возвращается 304.
+    Если ответ зависит от пользователя (user_dependent), в ETag входит
+    версия его избранного, списка покупок и подписок. Прочитанные версии
+    сохраняются в model_versions, чтобы обработчик не запрашивал их снова.
+    """
+
+    conditional_models = ()
+    user_dependent = False
+    cache_max_age = 0
+
+    def get_version_names(self, request):
+        names = [
+            versions.model_name(model) for model in self.conditional_models
+        ]
+        if self.user_dependent and request.user.is_authenticated:
+            names.append(versions.user_state_name(request.user.id))
+        return names
+
+    def get_validators(self, request):
+        names = self.get_version_names(request)
+        model_versions = versions.get_versions(names)
+        self.model_versions = dict(zip(names, model_versions))
+        user_id = request.user.id if self.user_dependent else None
+        fingerprint = '|'.join(map(str, (
+            type(self).__name__,
+            request.get_host(),
+            request.get_full_path(),
+            user_id,
+            *model_versions,
+        )))
+        etag = quote_etag(md5(fingerprint.encode()).hexdigest())
+        return etag, max(model_versions) // 1000
+
+    def conditional_get(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        if self.user_dependent and request.user.is_authenticated:
+            patch_cache_control(
+                response, private=True, max_age=0, must_revalidate=True
+            )
+        else:
+            patch_cache_control(
+                response, public=True, max_age=self.cache_max_age
+            )
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_get(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """Курсорная (keyset) пагинация ленты рецептов по (pub_date, id)."""
+
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-pub_date', '-id')
+
+
+class FeedPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с двумя дополнительными режимами:
+    ?pagination=cursor включает курсорную (keyset) пагинацию по
+    cursor_ordering, а ?count=false отключает подсчёт общего числа
+    объектов при обычной постраничной выдаче. Курсорный режим доступен
+    только для сортировки по умолчанию.
+    """
+
+    custom_ordering_params = ('ordering', 'ingredients', 'search')
+
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_ordering = ('-pub_date', '-id')
+
+    def get_mode(self, request):
+        default_ordering = not any(
+            request.query_params.get(param) not in (None, '', 'new')
+            for param in self.custom_ordering_params
+        )
+        if default_ordering and (
+            request.query_params.get('pagination') == 'cursor'
+            or CursorPagination.cursor_query_param in request.query_params
+        ):
+            return 'cursor'
+        if request.query_params.get('count') in ('false', '0'):
+            return 'no_count'
+        return 'page'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.mode = self.get_mode(request)
+        if self.mode == 'cursor':
+            self.cursor_pagination = KeysetPagination()
+            self.cursor_pagination.ordering = self.cursor_ordering
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        if self.mode == 'no_count':
+            return self.paginate_without_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = max(
+                int(request.query_params.get(self.page_query_param, 1)), 1
+            )
+        except ValueError:
+            self.page_number = 1
+        offset = (self.page_number - 1) * page_size
+        page = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(page) > page_size
+        return page[:page_size]
+
+    def get_paginated_response(self, data):
+        if self.mode == 'cursor':
+            return self.cursor_pagination.get_paginated_response(data)
+        if self.mode == 'no_count':
+            url = self.request.build_absolute_uri()
+            next_url = previous_url = None
+            if self.has_next:
+                next_url = replace_query_param(
+                    url, self.page_query_param, self.page_number + 1
+                )
+            if self.page_number == 2:
+                previous_url = remove_query_param(url, self.page_query_param)
+            elif self.page_number > 2:
+                previous_url = replace_query_param(
+                    url, self.page_query_param, self.page_number - 1
+                )
+            return Response(OrderedDict([
+                ('next', next_url),
+                ('previous', previous_url),
+                ('results', data),
+            ]))
+        return super().get_paginated_response(data)
+
+
+class SubscriptionPagination(FeedPagination):
+    cursor_ordering = ('-id',)
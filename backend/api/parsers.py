@@ -0,0 +1,38 @@
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import JSONParser, MultiPartParser
+
+
+class PayloadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большой запрос.'
+    default_code = 'payload_too_large'
+
+
+class PayloadSizeLimitMixin:
+    """
+    Отклоняет запрос, если заявленный размер тела больше
+    RECIPE_MAX_PAYLOAD_SIZE, не читая его.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > settings.RECIPE_MAX_PAYLOAD_SIZE:
+            raise PayloadTooLarge()
+        return super().parse(stream, media_type, parser_context)
+
+
+class RecipeJSONParser(PayloadSizeLimitMixin, JSONParser):
+    pass
+
+
+class RecipeMultiPartParser(PayloadSizeLimitMixin, MultiPartParser):
+    """
+    Multipart-запрос с изображением в виде файла: файл сохраняется во
+    временный файл на диске (FILE_UPLOAD_HANDLERS), а не в память.
+    """
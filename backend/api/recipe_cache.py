@@ -0,0 +1,153 @@
+import time
+from collections import OrderedDict
+from hashlib import md5
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import prefetch_related_objects
+
+from recipes import versions
+from recipes.models import Ingredient, Recipe, Tag
+
+from .serializers import RecipeSerializer
+
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру LRU-кеш в памяти процесса. Записи живут не
+    дольше timeout секунд.
+    """
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get_many(self, keys):
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                if key not in self._data:
+                    continue
+                expires, value = self._data[key]
+                if expires <= now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set_many(self, values):
+        expires = time.monotonic() + self.timeout
+        with self._lock:
+            for key, value in values.items():
+                self._data[key] = (expires, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+
+class DjangoCache:
+    """Обёртка над кешем Django из настройки CACHES."""
+
+    def __init__(self, alias, timeout):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get_many(self, keys):
+        return self.cache.get_many(keys)
+
+    def set_many(self, values):
+        self.cache.set_many(values, self.timeout)
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        options = settings.RECIPE_CACHE
+        if options['BACKEND'] == 'lru':
+            _backend = LRUCache(options['MAX_SIZE'], options['TIMEOUT'])
+        else:
+            _backend = DjangoCache(options['BACKEND'], options['TIMEOUT'])
+    return _backend
+
+
+def get_cache_keys(recipes, request):
+    """
+    Ключи кеша рецептов: версия рецепта (сам рецепт, его ингредиенты и
+    теги), версия автора и версии справочников тегов и ингредиентов.
+    """
+    names = [versions.model_name(Tag), versions.model_name(Ingredient)]
+    for recipe in recipes:
+        names.append(versions.recipe_name(recipe.id))
+        names.append(versions.user_name(recipe.author_id))
+    model_versions = versions.get_versions(names)
+    common = (request.scheme, request.get_host(), *model_versions[:2])
+    keys = []
+    for number, recipe in enumerate(recipes):
+        recipe_versions = model_versions[2 + number * 2:4 + number * 2]
+        fingerprint = '|'.join(map(str, (*common, *recipe_versions)))
+        keys.append(
+            f'recipe:{recipe.id}:{md5(fingerprint.encode()).hexdigest()}'
+        )
+    return keys
+
+
+def anonymous_representation(data):
+    return {
+        **data,
+        **{flag: False for flag in USER_FLAGS},
+        'author': {**data['author'], 'is_subscribed': False},
+    }
+
+
+def user_representation(data, recipe):
+    return {
+        **data,
+        **{flag: getattr(recipe, flag, False) for flag in USER_FLAGS},
+        'author': {
+            **data['author'],
+            'is_subscribed': getattr(recipe, 'is_author_subscribed', False),
+        },
+    }
+
+
+def serialize_recipes(recipes, request):
+    """
+    Представления рецептов для ответа API. Общая для всех пользователей
+    часть берётся из кеша, несохранённые в нём рецепты дозагружаются одним
+    набором запросов. Флаги пользователя накладываются из аннотаций
+    RecipeQuerySet.with_user_flags.
+    """
+    recipes = list(recipes)
+    backend = get_backend()
+    keys = get_cache_keys(recipes, request)
+    cached = backend.get_many(keys)
+    missing = {
+        key: recipe for recipe, key in zip(recipes, keys) if key not in cached
+    }
+    if missing:
+        prefetch_related_objects(
+            list(missing.values()), *Recipe.objects.prefetch_lookups()
+        )
+        serialized = RecipeSerializer(
+            missing.values(), many=True, context={'request': request}
+        ).data
+        fresh = {
+            key: anonymous_representation(data)
+            for key, data in zip(missing, serialized)
+        }
+        backend.set_many(fresh)
+        cached.update(fresh)
+    return [
+        user_representation(cached[key], recipe)
+        for recipe, key in zip(recipes, keys)
+    ]
@@ -1,17 +1,42 @@
+import json
+from decimal import Decimal
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import prefetch_related_objects
 from django.db.transaction import atomic
 from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
 from rest_framework import serializers
+from rest_framework.utils import html
 
+from recipes import cart, units, versions
 from recipes.models import (
     Favorite,
     Ingredient,
     IngredientInRecipe,
     Recipe,
+    ShoppingCartExport,
     ShoppingList,
     Tag
 )
+from recipes.signals import counters_disabled
 from users.models import User
 
+from .images import get_variant_urls
+
+
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не задан."""
+    recipes_limit = request.query_params.get('recipes_limit')
+    if recipes_limit is not None:
+        try:
+            return max(int(recipes_limit), 0)
+        except ValueError:
+            "Ошибка преобразования типа."
+    return None
+
 
 class CurrentUserSerializer(serializers.ModelSerializer):
     """ Сериализатор модели пользователей. """
@@ -24,6 +49,8 @@ class CurrentUserSerializer(serializers.ModelSerializer):
         extra_kwargs = {'is_subscribed': {'required': False}}
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -46,6 +73,18 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
+class AmountField(serializers.DecimalField):
+    """Количество ингредиента: целое число в ответе, если дробной части нет."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_digits', 10)
+        kwargs.setdefault('decimal_places', 3)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return units.to_number(Decimal(value))
+
+
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
     """ Сериализатор ингредиентов в рецепте. """
 
@@ -53,11 +92,8 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         source='ingredient',
         read_only=True
     )
-    measurement_unit = serializers.SlugRelatedField(
-        source='ingredient',
-        slug_field='measurement_unit',
-        read_only=True,
-    )
+    amount = AmountField(read_only=True)
+    measurement_unit = serializers.SerializerMethodField()
     name = serializers.SlugRelatedField(
         source='ingredient',
         slug_field='name',
@@ -68,56 +104,208 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         model = IngredientInRecipe
         fields = ('id', 'name', 'amount', 'measurement_unit')
 
+    def get_measurement_unit(self, obj):
+        return obj.unit or obj.ingredient.measurement_unit
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения рецепта."""
+
+    def __init__(self, **kwargs):
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return get_variant_urls(recipe, self.context.get('request'))
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Изображение рецепта: строка base64 или файл multipart-запроса.
+    Размер файла и изображения проверяются по заголовку без декодирования
+    пикселей.
+    """
+
+    default_error_messages = {
+        'file_too_large': 'Размер файла не должен превышать {max_size} байт.',
+        'image_too_large': (
+            'Размер изображения не должен превышать {width}x{height}.'
+        ),
+        'invalid_image': 'Загрузите корректное изображение.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            self.check_file_size(len(data) * 3 // 4)
+            file = super().to_internal_value(data)
+        elif isinstance(data, UploadedFile):
+            file = serializers.FileField.to_internal_value(self, data)
+        else:
+            return super().to_internal_value(data)
+        self.check_image(file)
+        return file
+
+    def check_file_size(self, size):
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail(
+                'file_too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE
+            )
+
+    def check_image(self, file):
+        self.check_file_size(file.size)
+        try:
+            with Image.open(file) as image:
+                image_format, (width, height) = image.format, image.size
+        except (OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        extension = 'jpg' if image_format == 'JPEG' else image_format.lower()
+        if extension not in self.ALLOWED_TYPES:
+            self.fail('invalid_image')
+        max_width, max_height = settings.RECIPE_IMAGE_MAX_DIMENSIONS
+        if width > max_width or height > max_height:
+            self.fail('image_too_large', width=max_width, height=max_height)
+        if isinstance(file, UploadedFile):
+            file.name = f'{uuid4()}.{extension}'
+
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для модели Recipe"""
 
     author = CurrentUserSerializer(read_only=True)
-    ingredients = serializers.SerializerMethodField()
+    ingredients = IngredientInRecipeSerializer(
+        source='recipe_ingredients',
+        many=True,
+        read_only=True
+    )
     tags = TagSerializer(many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_variants',
+                  'text', 'cooking_time')
 
-    @staticmethod
-    def get_ingredients(obj):
-        ingredients = IngredientInRecipe.objects.filter(recipe_parent=obj)
-        return IngredientInRecipeSerializer(ingredients, many=True).data
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if not user or user.is_anonymous:
             return False
         return user.favorites.filter(recipe_id=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if not user or user.is_anonymous:
             return False
         return user.shop_list.filter(recipe_id=obj).exists()
 
 
+def get_in_bulk(queryset, pks, name):
+    """
+    Объекты queryset с первичными ключами pks одним запросом in_bulk в
+    порядке pks. Все повторы и отсутствующие ключи перечисляются в одной
+    ошибке валидации.
+    """
+    seen, duplicates = {}, set()
+    for pk in pks:
+        if pk in seen:
+            duplicates.add(pk)
+        seen[pk] = None
+    found = queryset.in_bulk(list(seen))
+    missing = [pk for pk in seen if pk not in found]
+    errors = []
+    if duplicates:
+        errors.append(
+            f'Есть повторяющиеся {name}: '
+            f'{", ".join(map(str, sorted(duplicates)))}.'
+        )
+    if missing:
+        errors.append(f'Не найдены {name}: {", ".join(map(str, missing))}.')
+    if errors:
+        raise serializers.ValidationError(errors)
+    return [found[pk] for pk in pks]
+
+
+class PrimaryKeyListField(serializers.ListField):
+    """Список первичных ключей, проверяемый одним запросом."""
+
+    child = serializers.IntegerField()
+
+    def __init__(self, queryset, name, **kwargs):
+        self.queryset = queryset
+        self.name = name
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return get_in_bulk(
+            self.queryset.all(), super().to_internal_value(data), self.name
+        )
+
+    def to_representation(self, value):
+        return [obj.pk for obj in value.all()]
+
+
+class AddIngredientListSerializer(serializers.ListSerializer):
+    """Проверяет все ингредиенты рецепта одним запросом."""
+
+    def to_internal_value(self, data):
+        items = [
+            {'unit': '', **item} for item in super().to_internal_value(data)
+        ]
+        ingredients = get_in_bulk(
+            Ingredient.objects.all(), [item['id'] for item in items],
+            'ингредиенты',
+        )
+        incompatible = [
+            f'{ingredient.name} ({item["unit"]})'
+            for ingredient, item in zip(ingredients, items)
+            if item['unit'] and not units.is_convertible(
+                item['unit'], ingredient.measurement_unit, ingredient.density
+            )
+        ]
+        if incompatible:
+            raise serializers.ValidationError(
+                'Единицу нельзя перевести в единицу ингредиента: '
+                f'{", ".join(incompatible)}.'
+            )
+        return [
+            {
+                'ingredient': ingredient,
+                'amount': item['amount'],
+                'unit': units.line_unit(
+                    item['unit'], ingredient.measurement_unit
+                ),
+            }
+            for ingredient, item in zip(ingredients, items)
+        ]
+
+
 class AddIngredientSerializer(serializers.ModelSerializer):
     """Вспомогательный сериализатор для RecipeCreateSerializer"""
 
-    id = serializers.PrimaryKeyRelatedField(source='ingredient',
-                                            queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
+    amount = AmountField(min_value=Decimal('0.001'))
+    unit = serializers.CharField(
+        max_length=20, required=False, allow_blank=True
+    )
 
     class Meta:
         model = IngredientInRecipe
-        fields = ('id', 'amount')
-
-    def create(self, validated_data):
-        return IngredientInRecipe.objects.create(
-            ingredient=validated_data.get('id'),
-            amount=validated_data.get('amount')
-        )
+        fields = ('id', 'amount', 'unit')
+        list_serializer_class = AddIngredientListSerializer
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -125,36 +313,47 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
     author = CurrentUserSerializer(read_only=True)
     ingredients = AddIngredientSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True,
-    )
-    image = Base64ImageField(use_url=True, max_length=None)
+    tags = PrimaryKeyListField(queryset=Tag.objects.all(), name='теги')
+    image = RecipeImageField(use_url=True, max_length=None)
 
     class Meta:
         model = Recipe
         fields = ('id', 'author', 'ingredients', 'tags', 'image', 'name',
                   'text', 'cooking_time',)
 
+    def to_internal_value(self, data):
+        if html.is_html_input(data):
+            data = self.parse_multipart(data)
+        return super().to_internal_value(data)
+
+    def parse_multipart(self, data):
+        """
+        Данные multipart-запроса: теги передаются повторяющимся полем tags,
+        ингредиенты — JSON-строкой в поле ingredients.
+        """
+        values = data.dict()
+        if 'tags' in data:
+            values['tags'] = data.getlist('tags')
+        if 'ingredients' in data:
+            try:
+                values['ingredients'] = json.loads(data['ingredients'])
+            except ValueError:
+                raise serializers.ValidationError({
+                    'ingredients': ['Ожидается JSON-список ингредиентов.']
+                })
+        return values
+
     def create_ingredients(self, recipe, ingredients):
         IngredientInRecipe.objects.bulk_create([
             IngredientInRecipe(
                 recipe_parent=recipe,
                 amount=ingredient['amount'],
+                unit=ingredient['unit'],
                 ingredient=ingredient['ingredient'],
             ) for ingredient in ingredients
         ])
 
     def validate(self, data):
-        ingredients = self.initial_data.get('ingredients')
-        ingredients_list = []
-        for ingredient in ingredients:
-            ingredient_id = ingredient['id']
-            if ingredient_id in ingredients_list:
-                raise serializers.ValidationError(
-                    'Есть повторяющиеся ингредиенты!'
-                )
-            ingredients_list.append(ingredient_id)
         if data['cooking_time'] <= 0:
             raise serializers.ValidationError(
                 'Время приготовления должно быть больше 0!'
@@ -168,21 +367,101 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(
             author=request.user,
+            ingredients_count=len(ingredients),
             **validated_data
         )
         self.create_ingredients(recipe, ingredients)
         recipe.tags.set(tags)
         return recipe
 
+    @staticmethod
+    def diff_ingredients(recipe, existing, lines):
+        """
+        Разница между строками рецепта existing и новыми lines: удалённые
+        id, изменённые и новые строки и изменения списков покупок в
+        базовых единицах.
+        """
+        deltas = {}
+        deleted, changed = [], []
+        for ingredient_id, row in existing.items():
+            line = lines.get(ingredient_id)
+            if line is not None and (row.amount, row.unit) == (
+                line['amount'], line['unit']
+            ):
+                continue
+            cart.add_line_delta(
+                deltas, row.ingredient, row.amount, row.unit, -1
+            )
+            if line is None:
+                deleted.append(row.id)
+                continue
+            cart.add_line_delta(
+                deltas, row.ingredient, line['amount'], line['unit']
+            )
+            row.amount, row.unit = line['amount'], line['unit']
+            changed.append(row)
+        created = []
+        for ingredient_id, line in lines.items():
+            if ingredient_id not in existing:
+                created.append(IngredientInRecipe(
+                    recipe_parent=recipe, ingredient_id=ingredient_id,
+                    amount=line['amount'], unit=line['unit'],
+                ))
+                cart.add_line_delta(
+                    deltas, line['ingredient'], line['amount'], line['unit']
+                )
+        return deleted, changed, created, deltas
+
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Приводит ингредиенты рецепта к ingredients, меняя только
+        добавленные, изменённые и удалённые строки, и переносит разницу в
+        списки покупок с этим рецептом.
+        """
+        cart.lock_recipes([recipe.id])
+        existing = {
+            row.ingredient_id: row
+            for row in IngredientInRecipe.objects.filter(
+                recipe_parent=recipe
+            ).select_related('ingredient')
+        }
+        deleted, changed, created, deltas = self.diff_ingredients(
+            recipe, existing, {
+                ingredient['ingredient'].id: ingredient
+                for ingredient in ingredients
+            }
+        )
+        recipe.ingredients_count = len(existing) - len(deleted) + len(created)
+        if deleted:
+            with counters_disabled():
+                IngredientInRecipe.objects.filter(id__in=deleted).delete()
+        if changed:
+            IngredientInRecipe.objects.bulk_update(
+                changed, ('amount', 'unit')
+            )
+        if created:
+            IngredientInRecipe.objects.bulk_create(created)
+        if deltas:
+            cart.change_recipe(recipe.id, deltas)
+            versions.bump(
+                versions.model_name(IngredientInRecipe),
+                versions.recipe_name(recipe.id),
+            )
+
     @atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        recipe = instance
-        IngredientInRecipe.objects.filter(recipe_parent=recipe).delete()
-        self.create_ingredients(recipe, ingredients)
-        return super().update(recipe, validated_data)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        if tags is not None:
+            instance.tags.set(tags)
+        return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], *Recipe.objects.prefetch_lookups()
+        )
         return RecipeSerializer(
             instance,
             context={
@@ -197,16 +476,18 @@ class RecipeShortSerializer(serializers.ModelSerializer):
     ShoppingListSerializer
     """
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class FollowSerializer(CurrentUserSerializer):
     """Сериализатор для модели Follow"""
 
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
+    recipes_count = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -215,20 +496,16 @@ class FollowSerializer(CurrentUserSerializer):
                   'is_subscribed', 'recipes', 'recipes_count',)
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes = obj.recipes.all()
-        recipes_limit = request.query_params.get('recipes_limit')
-        if recipes_limit is not None:
-            try:
-                recipes = recipes[:int(recipes_limit)]
-            except ValueError:
-                "Ошибка преобразования типа."
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is not None:
+            recipes = recipes_by_author.get(obj.id, [])
+        else:
+            recipes = obj.recipes.all()
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit is not None:
+                recipes = recipes[:recipes_limit]
         return RecipeShortSerializer(recipes, many=True).data
 
-    @staticmethod
-    def get_recipes_count(obj):
-        return obj.recipes.count()
-
 
 class FavoriteSerializer(RecipeShortSerializer):
     """Сериализатор для модели Favorite"""
@@ -251,24 +528,42 @@ class ShoppingListSerializer(RecipeShortSerializer):
         model = ShoppingList
         fields = ('user', 'recipe')
 
-    def validate(self, data):
-        request = self.context.get('request')
-        recipe_id = data['recipe'].id
-        purchase_exists = ShoppingList.objects.filter(
-            user=request.user,
-            recipe__id=recipe_id
-        ).exists()
-
-        if request.method == 'POST' and purchase_exists:
-            raise serializers.ValidationError(
-                'Рецепт уже в списке покупок'
-            )
-
-        return data
-
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
         return RecipeShortSerializer(
             instance.recipe,
             context=context).data
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления и удаления."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.RECIPE_BATCH_MAX_SIZE,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
+class ShoppingCartItemSerializer(serializers.Serializer):
+    """Ингредиент сводного списка покупок в единицах показа"""
+
+    id = serializers.ReadOnlyField(source='ingredient')
+    name = serializers.ReadOnlyField(source='ingredient__name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient__measurement_unit'
+    )
+    amount = AmountField(source='ingredient_value', read_only=True)
+
+
+class ShoppingCartExportSerializer(serializers.ModelSerializer):
+    """Сериализатор фоновой выгрузки списка покупок"""
+
+    class Meta:
+        model = ShoppingCartExport
+        fields = ('id', 'status', 'file', 'created')
+        read_only_fields = ('status', 'file', 'created')
@@ -1,42 +1,224 @@
+import csv
+import hashlib
 import io
+import json
+import os
+from functools import lru_cache
+from uuid import uuid4
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db.models import F
+from django.http import StreamingHttpResponse
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
+from rest_framework.exceptions import ValidationError
 
+from recipes import units
+from recipes.models import ShoppingCartExport, ShoppingCartItem
 
-def create_shopping_cart(ingredients_cart):
-    """Функция для формирования списка покупок."""
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = (
-        "attachment; filename='shopping_cart.pdf'"
-    )
+from .workers import submit
+
+FONT_NAME = 'Arial'
+CHUNK_SIZE = 8192
+
+
+def get_ingredients_cart(user):
+    """
+    Суммарное количество каждого ингредиента в списке покупок из сводной
+    таблицы ShoppingCartItem в базовых единицах.
+    """
+    return ShoppingCartItem.objects.filter(user=user).values(
+        'ingredient',
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'unit',
+        ingredient_value=F('amount'),
+    ).order_by('ingredient__name', 'unit')
+
+
+def get_display_mode(query_params):
+    """Единицы показа списка покупок из параметра units."""
+    mode = query_params.get('units') or settings.SHOPPING_CART_DISPLAY_UNITS
+    if mode not in units.DISPLAY_MODES:
+        raise ValidationError({'units': [
+            f'Допустимые значения: {", ".join(units.DISPLAY_MODES)}.'
+        ]})
+    return mode
+
+
+def to_display_units(ingredients_cart, mode):
+    """Переводит количества списка покупок в единицы показа mode."""
+    for ingredient in ingredients_cart:
+        amount, unit = units.to_display(
+            ingredient['ingredient_value'],
+            ingredient['unit'],
+            ingredient['ingredient__measurement_unit'],
+            mode,
+        )
+        yield {
+            'ingredient': ingredient['ingredient'],
+            'ingredient__name': ingredient['ingredient__name'],
+            'ingredient__measurement_unit': unit,
+            'ingredient_value': amount,
+        }
+
+
+def get_display_cart(user, mode):
+    """Список покупок пользователя в единицах показа mode."""
+    return to_display_units(get_ingredients_cart(user).iterator(), mode)
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Регистрирует шрифт один раз на процесс."""
     pdfmetrics.registerFont(
-        TTFont('Arial', 'data/arial.ttf', 'UTF-8')
+        TTFont(
+            FONT_NAME,
+            os.path.join(settings.BASE_DIR, 'data', 'arial.ttf'),
+            'UTF-8'
+        )
+    )
+
+
+def get_cart_hash(ingredients_cart):
+    """Хеш содержимого списка покупок для ключа кеша."""
+    content = json.dumps(
+        ingredients_cart, ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def format_line(number, ingredient):
+    return (
+        f"{number}. {ingredient['ingredient__name']}: "
+        f"{units.format_amount(ingredient['ingredient_value'])} "
+        f"{ingredient['ingredient__measurement_unit']}."
     )
+
+
+def render_shopping_cart(ingredients_cart):
+    """Формирует PDF со списком покупок и возвращает его байты."""
+    register_font()
     buffer = io.BytesIO()
     pdf_file = canvas.Canvas(buffer)
-    pdf_file.setFont('Arial', 24)
+    pdf_file.setFont(FONT_NAME, 24)
     pdf_file.drawString(200, 800, 'Список покупок.')
-    pdf_file.setFont('Arial', 14)
+    pdf_file.setFont(FONT_NAME, 14)
     from_bottom = 750
     for number, ingredient in enumerate(ingredients_cart, start=1):
-        pdf_file.drawString(
-            50,
-            from_bottom,
-            f"{number}. {ingredient['ingredient__name']}: "
-            f"{ingredient['ingredient_value']} "
-            f"{ingredient['ingredient__measurement_unit']}.",
-        )
+        pdf_file.drawString(50, from_bottom, format_line(number, ingredient))
         from_bottom -= 20
         if from_bottom <= 50:
             from_bottom = 800
             pdf_file.showPage()
-            pdf_file.setFont('Arial', 14)
+            pdf_file.setFont(FONT_NAME, 14)
     pdf_file.showPage()
     pdf_file.save()
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
+    return buffer.getvalue()
+
+
+def iter_chunks(content):
+    """Отдаёт содержимое кусками по CHUNK_SIZE байт."""
+    for start in range(0, len(content), CHUNK_SIZE):
+        yield content[start:start + CHUNK_SIZE]
+
+
+def iter_text(ingredients_cart):
+    yield 'Список покупок.\n'
+    for number, ingredient in enumerate(ingredients_cart, start=1):
+        yield format_line(number, ingredient) + '\n'
+
+
+class Echo:
+    """Псевдобуфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(ingredients_cart):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for ingredient in ingredients_cart:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            units.format_amount(ingredient['ingredient_value']),
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+def iter_json(ingredients_cart):
+    yield '['
+    for number, ingredient in enumerate(ingredients_cart):
+        yield (',' if number else '') + json.dumps(
+            {
+                'name': ingredient['ingredient__name'],
+                'amount': units.to_number(ingredient['ingredient_value']),
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+            },
+            ensure_ascii=False,
+        )
+    yield ']'
+
+
+STREAMING_EXPORTS = {
+    'txt': ('text/plain; charset=utf-8', iter_text),
+    'csv': ('text/csv; charset=utf-8', iter_csv),
+    'json': ('application/json', iter_json),
+}
+
+
+def stream_shopping_cart(ingredients_cart, export_format):
+    """Потоковая выгрузка списка покупок в текстовом формате."""
+    content_type, generator = STREAMING_EXPORTS[export_format]
+    response = StreamingHttpResponse(
+        generator(ingredients_cart), content_type=content_type
+    )
+    response['Content-Disposition'] = (
+        f"attachment; filename='shopping_cart.{export_format}'"
+    )
     return response
+
+
+def create_shopping_cart(ingredients_cart):
+    """Функция для формирования списка покупок."""
+    ingredients_cart = list(ingredients_cart)
+    cache_key = f'shopping_cart:pdf:{get_cart_hash(ingredients_cart)}'
+    pdf = cache.get(cache_key)
+    if pdf is None:
+        pdf = render_shopping_cart(ingredients_cart)
+        cache.set(cache_key, pdf, settings.SHOPPING_CART_CACHE_TIMEOUT)
+    response = StreamingHttpResponse(
+        iter_chunks(pdf), content_type='application/pdf'
+    )
+    response['Content-Disposition'] = (
+        "attachment; filename='shopping_cart.pdf'"
+    )
+    response['Content-Length'] = len(pdf)
+    return response
+
+
+def start_export(export, ingredients_cart):
+    """Ставит формирование PDF для выгрузки export в фоновый пул."""
+    export_id = export.id
+
+    def on_success(pdf):
+        export = ShoppingCartExport.objects.get(id=export_id)
+        export.file.save(f'{uuid4().hex}.pdf', ContentFile(pdf), save=False)
+        export.status = ShoppingCartExport.DONE
+        export.save(update_fields=('file', 'status'))
+
+    def on_error(error):
+        ShoppingCartExport.objects.filter(id=export_id).update(
+            status=ShoppingCartExport.FAILED
+        )
+
+    submit(
+        render_shopping_cart,
+        list(ingredients_cart),
+        on_success=on_success,
+        on_error=on_error,
+    )
@@ -5,6 +5,7 @@ from .views import (
     CurrentUserViewSet,
     IngredientViewSet,
     RecipeViewSet,
+    ShoppingCartExportViewSet,
     TagViewSet
 )
 
@@ -13,6 +14,11 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('users', CurrentUserViewSet, basename='users')
+router.register(
+    'shopping_cart_exports',
+    ShoppingCartExportViewSet,
+    basename='shopping_cart_exports'
+)
 
 app_name = 'api'
 
@@ -1,32 +1,68 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Value
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from recipes import versions
+from recipes.cart import (
+    lock_recipes,
+    lock_users,
+    rebuild_carts,
+    remove_recipes
+)
 from recipes.models import (
     Favorite,
     Ingredient,
     IngredientInRecipe,
     Recipe,
+    RecipeRanking,
     ShoppingList,
     Tag
 )
-from users.models import User
+from recipes.signals import (
+    change_counter,
+    counters_disabled,
+    recount_favorites
+)
+from users.models import Follow, User
 
-from .filters import IngredientSearchFilter, RecipeFilter
+from .filters import RecipeFilter
+from .indexes import ingredient_index
+from .mixins import ConditionalGetMixin
+from .pagination import (
+    FeedPagination,
+    KeysetPagination,
+    SubscriptionPagination
+)
+from .parsers import RecipeJSONParser, RecipeMultiPartParser
+from .recipe_cache import serialize_recipes
+from .renderers import SHOPPING_CART_RENDERERS, ShoppingCartRenderer
 from .serializers import (
     FavoriteSerializer,
     FollowSerializer,
     IngredientSerializer,
+    RecipeBatchSerializer,
     RecipeCreateSerializer,
     RecipeSerializer,
+    ShoppingCartExportSerializer,
+    ShoppingCartItemSerializer,
     ShoppingListSerializer,
-    TagSerializer
+    TagSerializer,
+    get_recipes_limit
+)
+from .shop_cart import (
+    create_shopping_cart,
+    get_display_cart,
+    get_display_mode,
+    start_export,
+    stream_shopping_cart
 )
-from .shop_cart import create_shopping_cart
 
 
 class CurrentUserViewSet(viewsets.GenericViewSet):
@@ -34,6 +70,7 @@ class CurrentUserViewSet(viewsets.GenericViewSet):
 
     queryset = User.objects.all()
     serializer_class = FollowSerializer
+    pagination_class = SubscriptionPagination
     search_fields = ('username',)
 
     @action(
@@ -42,20 +79,41 @@ class CurrentUserViewSet(viewsets.GenericViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def subscribe(self, request, pk):
-        author = get_object_or_404(User, id=pk)
+        """
+        Подписка и отписка одним запросом к базе. Повторную подписку и
+        подписку на себя отсекают ограничения таблицы Follow.
+        """
         if request.method != 'POST':
-            request.user.subscribe.remove(author)
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        if not request.user.subscribe.filter(id=pk).exists():
-            request.user.subscribe.add(author)
-            serializer = self.serializer_class(
-                author, context={'request': request}
+            with transaction.atomic():
+                lock_users([request.user.id])
+                deleted, _ = Follow.objects.filter(
+                    user=request.user, author_id=pk
+                ).delete()
+            if deleted:
+                return Response(status=status.HTTP_204_NO_CONTENT)
+            get_object_or_404(User, id=pk)
+            return Response(
+                {'errors': 'Вы не подписаны на данного пользователя'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(
-            {'errors': 'Вы уже подписаны на данного пользователя'},
-            status=status.HTTP_400_BAD_REQUEST
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=request.user, author_id=pk)
+        except IntegrityError:
+            author = get_object_or_404(User, id=pk)
+            if author == request.user:
+                error = 'Нельзя подписаться на самого себя'
+            else:
+                error = 'Вы уже подписаны на данного пользователя'
+            return Response(
+                {'errors': error}, status=status.HTTP_400_BAD_REQUEST
+            )
+        author = User.objects.get(id=pk)
+        author.is_subscribed = True
+        serializer = self.serializer_class(
+            author, context={'request': request}
         )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(
         detail=False,
@@ -63,45 +121,143 @@ class CurrentUserViewSet(viewsets.GenericViewSet):
     )
     def subscriptions(self, request):
         subscriptions_list = self.paginate_queryset(
-            self.request.user.subscribe.all()
+            self.request.user.subscribe.annotate(
+                is_subscribed=Value(True, output_field=BooleanField()),
+            )
+        )
+        recipes_by_author = Recipe.objects.latest_by_author(
+            [author.id for author in subscriptions_list],
+            limit=get_recipes_limit(request),
         )
         serializer = FollowSerializer(
             subscriptions_list, many=True, context={
-                'request': request
+                'request': request,
+                'recipes_by_author': recipes_by_author,
             }
         )
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет работы с обьектами класса Tag"""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    conditional_models = (Tag,)
+    cache_max_age = settings.STATIC_API_CACHE_MAX_AGE
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для работы с обьектами класса Ingredien"""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
-    filter_backends = (DjangoFilterBackend, IngredientSearchFilter)
-    search_fields = ('^name', )
     pagination_class = None
+    conditional_models = (Ingredient,)
+    cache_max_age = settings.STATIC_API_CACHE_MAX_AGE
 
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(self.search, request, *args, **kwargs)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def search(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs
+            )
+        try:
+            limit = int(request.query_params.get('limit'))
+        except (TypeError, ValueError):
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        serializer = self.get_serializer(
+            ingredient_index.search(
+                name, limit=max(limit, 0),
+                version=self.model_versions[versions.model_name(Ingredient)],
+            ),
+            many=True,
+        )
+        return Response(serializer.data)
+
+
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """ Контроллер рецептов. """
-    queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    pagination_class = FeedPagination
+    parser_classes = (RecipeJSONParser, RecipeMultiPartParser)
+    conditional_models = (Recipe, IngredientInRecipe, Tag, Ingredient, User)
+    user_dependent = True
     filterset_fields = [
         'tags', 'author', 'is_in_shopping_cart', 'is_favorited'
     ]
 
+    def get_queryset(self):
+        queryset = Recipe.objects.all()
+        if self.request.method in SAFE_METHODS:
+            queryset = queryset.select_related('author').with_user_flags(
+                self.request.user
+            )
+        return queryset
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """
+        Ошибки выгрузки списка покупок, в том числе 401 и неизвестный
+        format, отдаются в JSON, а не в формате файла.
+        """
+        if getattr(response, 'exception', False) and isinstance(
+            getattr(request, 'accepted_renderer', None),
+            (ShoppingCartRenderer, type(None)),
+        ):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def get_version_names(self, request):
+        names = super().get_version_names(request)
+        ordering = request.query_params.get('ordering')
+        if ordering == 'popular':
+            names.append(versions.model_name(Favorite))
+        elif ordering == 'trending':
+            names.append(versions.model_name(RecipeRanking))
+        return names
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(
+            self.list_from_cache, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_get(
+            self.retrieve_from_cache, request, *args, **kwargs
+        )
+
+    def list_from_cache(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(serialize_recipes(page, request))
+
+    def retrieve_from_cache(self, request, *args, **kwargs):
+        [data] = serialize_recipes([self.get_object()], request)
+        return Response(data)
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=KeysetPagination,
+    )
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь."""
+        return self.conditional_get(self.feed_from_cache, request)
+
+    def feed_from_cache(self, request):
+        page = self.paginate_queryset(
+            self.get_queryset().feed_for(request.user)
+        )
+        return self.get_paginated_response(serialize_recipes(page, request))
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeSerializer
@@ -109,21 +265,135 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @staticmethod
     def post_method_for_actions(request, pk, serializers):
-        data = {'user': request.user.id, 'recipe': pk}
-        serializer = serializers(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        """
+        Добавляет рецепт в избранное или список покупок одним INSERT.
+        Повтор отсекает уникальное ограничение таблицы.
+        """
+        model = serializers.Meta.model
+        try:
+            with transaction.atomic():
+                if model is ShoppingList:
+                    lock_recipes([pk])
+                instance = model.objects.create(
+                    user=request.user, recipe_id=pk
+                )
+        except IntegrityError:
+            get_object_or_404(Recipe, id=pk)
+            return Response(
+                {'errors': 'Рецепт уже добавлен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = serializers(instance, context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def delete_method_for_actions(self, request, pk, model):
+        """
+        Удаляет рецепт из избранного или списка покупок одним DELETE без
+        чтения строк и сигналов. Счётчик избранного и список покупок
+        меняются по числу удалённых строк.
+        """
+        with transaction.atomic():
+            queryset = model.objects.filter(user=request.user, recipe_id=pk)
+            deleted = queryset._raw_delete(queryset.db)
+            if deleted and model is Favorite:
+                change_counter(Recipe, pk, 'favorites_count', -deleted)
+            if deleted and model is ShoppingList:
+                remove_recipes(request.user.id, [pk])
+        if deleted:
+            self.bump_batch_versions(request, model)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        get_object_or_404(Recipe, id=pk)
+        return Response(
+            {'errors': 'Рецепт не был добавлен'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
     @staticmethod
-    def delete_method_for_actions(request, pk, model):
-        user = request.user
-        recipe = get_object_or_404(Recipe, id=pk)
-        model_instance = get_object_or_404(model, user=user, recipe=recipe)
-        model_instance.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
-
-    @action(detail=True, methods=['post'])
+    def get_batch(request, model):
+        """
+        Id рецептов из тела запроса, разделённые на несуществующие,
+        уже добавленные пользователем в model и остальные.
+        """
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        found = set(
+            Recipe.objects.filter(id__in=recipe_ids).values_list(
+                'id', flat=True
+            )
+        )
+        present = set(
+            model.objects.filter(
+                user=request.user, recipe_id__in=found
+            ).values_list('recipe_id', flat=True)
+        )
+        return recipe_ids, found, present
+
+    @staticmethod
+    def batch_response(recipe_ids, statuses):
+        return Response({'results': [
+            {'id': recipe_id, 'status': statuses.get(recipe_id, 'not_found')}
+            for recipe_id in recipe_ids
+        ]})
+
+    @staticmethod
+    def bump_batch_versions(request, model):
+        names = [versions.user_state_name(request.user.id)]
+        if model is Favorite:
+            names.append(versions.model_name(Favorite))
+        versions.bump(*names)
+
+    def batch_add(self, request, model):
+        """
+        Добавляет рецепты в model одним INSERT; дубликаты, в том числе
+        от параллельных запросов, отбрасывает уникальное ограничение.
+        """
+        recipe_ids, found, present = self.get_batch(request, model)
+        added = found - present
+        with transaction.atomic():
+            if model is ShoppingList:
+                lock_recipes(added)
+            model.objects.bulk_create(
+                (
+                    model(user=request.user, recipe_id=recipe_id)
+                    for recipe_id in added
+                ),
+                ignore_conflicts=True,
+            )
+            if model is Favorite and added:
+                recount_favorites(added)
+            if model is ShoppingList and added:
+                rebuild_carts([request.user.id])
+        self.bump_batch_versions(request, model)
+        statuses = {
+            **{recipe_id: 'added' for recipe_id in added},
+            **{recipe_id: 'exists' for recipe_id in present},
+        }
+        return self.batch_response(recipe_ids, statuses)
+
+    def batch_remove(self, request, model):
+        """Удаляет рецепты из model одним DELETE."""
+        recipe_ids, found, present = self.get_batch(request, model)
+        with transaction.atomic(), counters_disabled():
+            if model is ShoppingList:
+                lock_recipes(present)
+            model.objects.filter(
+                user=request.user, recipe_id__in=present
+            ).delete()
+            if model is Favorite and present:
+                recount_favorites(present)
+            if model is ShoppingList and present:
+                rebuild_carts([request.user.id])
+        self.bump_batch_versions(request, model)
+        statuses = {
+            **{recipe_id: 'not_added' for recipe_id in found},
+            **{recipe_id: 'removed' for recipe_id in present},
+        }
+        return self.batch_response(recipe_ids, statuses)
+
+    @action(
+        detail=True, methods=('post',), permission_classes=(IsAuthenticated,)
+    )
     def shopping_cart(self, request, pk):
         return self.post_method_for_actions(
             request, pk, serializers=ShoppingListSerializer)
@@ -133,26 +403,46 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self.delete_method_for_actions(
             request=request, pk=pk, model=ShoppingList)
 
+    @action(
+        detail=False,
+        methods=('get',),
+        url_path='shopping_cart',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_items(self, request):
+        """
+        Сводный список покупок: ингредиенты с суммарным количеством в
+        единицах, заданных параметром units.
+        """
+        items = get_display_cart(
+            request.user, get_display_mode(request.query_params)
+        )
+        return Response(ShoppingCartItemSerializer(items, many=True).data)
+
     @action(
         detail=False,
         methods=('get',),
         url_path='download_shopping_cart',
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_CART_RENDERERS,
     )
     def download_shopping_cart(self, request):
-        shopping_cart = (
-            IngredientInRecipe.objects.filter(
-                recipe_parent__shop_list__user=request.user
-            ).values(
-                'ingredient__name',
-                'ingredient__measurement_unit',
-            ).order_by(
-                'ingredient__name'
-            ).annotate(ingredient_value=Sum('amount'))
+        """
+        Выгрузка списка покупок. Формат (pdf, txt, csv, json) выбирается
+        параметром format или заголовком Accept, по умолчанию PDF;
+        единицы измерения — параметром units.
+        """
+        shopping_cart = get_display_cart(
+            request.user, get_display_mode(request.query_params)
         )
-        return create_shopping_cart(shopping_cart)
+        export_format = request.accepted_renderer.format
+        if export_format == 'pdf':
+            return create_shopping_cart(shopping_cart)
+        return stream_shopping_cart(shopping_cart, export_format)
 
-    @action(detail=True, methods=['post'])
+    @action(
+        detail=True, methods=('post',), permission_classes=(IsAuthenticated,)
+    )
     def favorite(self, request, pk):
         return self.post_method_for_actions(
             request=request, pk=pk, serializers=FavoriteSerializer)
@@ -161,3 +451,56 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def delete_favorite(self, request, pk):
         return self.delete_method_for_actions(
             request=request, pk=pk, model=Favorite)
+
+    @action(
+        detail=False,
+        methods=('post',),
+        url_path='shopping_cart/batch',
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_batch(self, request):
+        return self.batch_add(request, ShoppingList)
+
+    @shopping_cart_batch.mapping.delete
+    def delete_shopping_cart_batch(self, request):
+        return self.batch_remove(request, ShoppingList)
+
+    @action(
+        detail=False,
+        methods=('post',),
+        url_path='favorite/batch',
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_batch(self, request):
+        return self.batch_add(request, Favorite)
+
+    @favorite_batch.mapping.delete
+    def delete_favorite_batch(self, request):
+        return self.batch_remove(request, Favorite)
+
+
+class ShoppingCartExportViewSet(mixins.CreateModelMixin,
+                                mixins.RetrieveModelMixin,
+                                viewsets.GenericViewSet):
+    """
+    Фоновая выгрузка списка покупок в PDF: POST ставит задачу,
+    GET по id возвращает её статус и ссылку на готовый файл.
+    """
+
+    serializer_class = ShoppingCartExportSerializer
+    permission_classes = (IsAuthenticated,)
+
+    def get_queryset(self):
+        return self.request.user.shopping_cart_exports.all()
+
+    def perform_create(self, serializer):
+        ingredients_cart = list(get_display_cart(
+            self.request.user, get_display_mode(self.request.query_params)
+        ))
+        export = serializer.save(user=self.request.user)
+        transaction.on_commit(lambda: start_export(export, ingredients_cart))
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
@@ -0,0 +1,72 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection
+
+SUBMIT_ATTEMPTS = 2
+
+_executor = None
+_lock = Lock()
+
+
+def get_executor():
+    """Пул процессов для тяжёлых задач, создаётся при первом обращении."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.BACKGROUND_WORKERS
+            )
+        return _executor
+
+
+def reset_executor(executor):
+    """
+    Забывает сломанный пул executor (упал один из его процессов):
+    следующая задача создаст новый.
+    """
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def submit(func, *args, on_success, on_error):
+    """
+    Выполняет func(*args) в пуле процессов. Обработчики результата
+    вызываются в потоке текущего процесса и могут работать с базой;
+    ошибка в on_success тоже передаётся в on_error. Если пул сломан, задача
+    отправляется в новый пул, а при повторной неудаче on_error вызывается
+    сразу.
+    """
+
+    def done(future):
+        try:
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                reset_executor(executor)
+            if error is None:
+                try:
+                    on_success(future.result())
+                    return
+                except Exception as handler_error:
+                    error = handler_error
+            on_error(error)
+        finally:
+            connection.close()
+
+    for _ in range(SUBMIT_ATTEMPTS):
+        executor = get_executor()
+        try:
+            future = executor.submit(func, *args)
+            break
+        except BrokenProcessPool as error:
+            reset_executor(executor)
+            failure = error
+    else:
+        on_error(failure)
+        return
+    future.add_done_callback(done)
@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
+    'api.apps.ApiConfig',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -111,6 +112,69 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 5,
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+# Единицы в списке покупок по умолчанию: ingredient — единица ингредиента,
+# base — г, мл, шт., auto — кг и л для больших количеств.
+SHOPPING_CART_DISPLAY_UNITS = os.getenv(
+    'SHOPPING_CART_DISPLAY_UNITS', 'ingredient'
+)
+
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+
+STATIC_API_CACHE_MAX_AGE = 10 * 60
+
+RECIPE_CACHE = {
+    # 'lru' - кеш в памяти процесса, иначе имя кеша из CACHES.
+    'BACKEND': os.getenv('RECIPE_CACHE_BACKEND', 'lru'),
+    'MAX_SIZE': 5000,
+    # Страховка для изменений в обход сигналов, например queryset.update().
+    'TIMEOUT': int(os.getenv('RECIPE_CACHE_TIMEOUT', 10 * 60)),
+}
+
+RANKING_EPOCH = '2023-01-01T00:00:00'
+RANKING_HALF_LIFE = 3 * 24 * 60 * 60
+RANKING_FAVORITE_WEIGHT = 1.0
+RANKING_SHOPPING_LIST_WEIGHT = 0.5
+# События моложе этого запаса, секунд, пересчитываются при каждом
+# обновлении: так учитываются транзакции, зафиксированные позже него.
+RANKING_OVERLAP = 10 * 60
+
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_INDEX_TTL = 5 * 60
+# Строить индекс ингредиентов при запуске процесса, а не на первом запросе.
+INGREDIENT_INDEX_PRELOAD = os.getenv('INGREDIENT_INDEX_PRELOAD', '1') == '1'
+
+SEARCH_CONFIG = 'russian'
+
+RECIPE_IMAGE_SIZES = {
+    'thumbnail': (320, 320),
+    'medium': (960, 960),
+}
+RECIPE_IMAGE_FORMATS = {
+    'jpg': 'JPEG',
+    'webp': 'WEBP',
+}
+RECIPE_IMAGE_QUALITY = 80
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+RECIPE_MAX_PAYLOAD_SIZE = 15 * 1024 * 1024
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_DIMENSIONS = (6000, 6000)
+
+RECIPE_BATCH_MAX_SIZE = 100
+
 AUTH_USER_MODEL = 'users.User'
 
 DJOSER = {
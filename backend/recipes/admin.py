@@ -1,10 +1,14 @@
 from django.contrib import admin
 
+from .cart import rebuild_ingredient_carts, rebuild_recipe_carts
 from .models import (
     Favorite,
     Ingredient,
     IngredientInRecipe,
     Recipe,
+    RecipeRanking,
+    ShoppingCartExport,
+    ShoppingCartItem,
     ShoppingList,
     Tag
 )
@@ -23,9 +27,16 @@ class TagAdmin(admin.ModelAdmin):
 class IngredientAdmin(admin.ModelAdmin):
     """Класс настройки раздела игредиентов"""
 
-    list_display = ('pk', 'name', 'measurement_unit')
+    list_display = ('pk', 'name', 'measurement_unit', 'density')
     search_fields = ('name',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and {'measurement_unit', 'density'} & set(
+            form.changed_data
+        ):
+            rebuild_ingredient_carts([obj.id])
+
 
 class TabularRecipeIngredientAdmin(admin.TabularInline):
     model = IngredientInRecipe
@@ -45,16 +56,38 @@ class RecipesAdmin(admin.ModelAdmin):
     ]
 
     def favorited(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     favorited.short_description = 'Кол-во людей добавивших в избранное'
+    favorited.admin_order_field = 'favorites_count'
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            rebuild_recipe_carts(form.instance.id)
 
 
 @admin.register(IngredientInRecipe)
 class IngredientRecipeAdmin(admin.ModelAdmin):
     """Класс настройки соответствия ингредиентов и рецепта"""
 
-    list_display = ('pk', 'ingredient', 'amount')
+    list_display = ('pk', 'ingredient', 'amount', 'unit')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rebuild_recipe_carts(obj.recipe_parent_id)
+        if change and 'recipe_parent' in form.changed_data:
+            rebuild_recipe_carts(form.initial['recipe_parent'])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_recipe_carts(obj.recipe_parent_id)
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_parent_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for recipe_id in recipe_ids:
+            rebuild_recipe_carts(recipe_id)
 
 
 @admin.register(ShoppingList)
@@ -62,6 +95,25 @@ class ShoppingListAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
 
 
+@admin.register(ShoppingCartItem)
+class ShoppingCartItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'amount', 'unit')
+    list_select_related = ('user', 'ingredient')
+    search_fields = ('user__username', 'ingredient__name')
+
+
+@admin.register(RecipeRanking)
+class RecipeRankingAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'base_score', 'updated')
+    ordering = ('-base_score',)
+
+
+@admin.register(ShoppingCartExport)
+class ShoppingCartExportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'created')
+    list_filter = ('status',)
+
+
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
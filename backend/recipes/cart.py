@@ -0,0 +1,190 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import units
+from .models import IngredientInRecipe, Recipe, ShoppingCartItem, ShoppingList
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+
+
+def lock_recipes(recipe_ids):
+    """
+    Блокирует строки рецептов до конца транзакции, чтобы изменение их
+    ингредиентов и добавление в списки покупок или удаление из них
+    выполнялись по очереди. Рецепты блокируются раньше пользователей,
+    иначе возможна взаимная блокировка. Возвращает id найденных рецептов.
+    """
+    return set(
+        Recipe.objects.select_for_update().filter(id__in=recipe_ids).order_by(
+            'id'
+        ).values_list('id', flat=True)
+    )
+
+
+def lock_users(user_ids):
+    """
+    Блокирует строки пользователей до конца транзакции, чтобы изменения
+    их списков покупок, избранного и подписок выполнялись по очереди.
+    """
+    list(
+        User.objects.select_for_update().filter(id__in=user_ids).order_by(
+            'id'
+        ).values_list('id', flat=True)
+    )
+
+
+LINE_FIELDS = (
+    'ingredient', 'ingredient__measurement_unit', 'ingredient__density',
+    'amount', 'unit',
+)
+
+
+def get_lines(queryset, *group):
+    """Строки ингредиентов для units.sum_amounts, сгруппированные по group."""
+    return queryset.values_list(*group, *LINE_FIELDS).order_by().iterator()
+
+
+def get_recipe_amounts(recipe_ids):
+    """
+    Суммарное количество каждого ингредиента в рецептах recipe_ids в
+    базовых единицах: {(id ингредиента, единица): количество}.
+    """
+    lines = get_lines(
+        IngredientInRecipe.objects.filter(recipe_parent__in=recipe_ids)
+    )
+    totals = units.sum_amounts((None, *line) for line in lines)
+    return {
+        (ingredient_id, unit): total
+        for (_, ingredient_id, unit), total in totals.items()
+    }
+
+
+def add_line_delta(deltas, ingredient, amount, unit, sign=1):
+    """
+    Добавляет в deltas ({(id ингредиента, базовая единица): изменение})
+    строку рецепта: amount единиц unit ингредиента ingredient со знаком sign.
+    """
+    value, base_unit = units.to_base(
+        amount, unit, ingredient.measurement_unit, ingredient.density
+    )
+    key = (ingredient.id, base_unit)
+    deltas[key] = deltas.get(key, 0) + sign * value
+
+
+@transaction.atomic(savepoint=False)
+def apply_deltas(user_ids, deltas):
+    """
+    Изменяет списки покупок пользователей user_ids на deltas
+    ({(id ингредиента, базовая единица): изменение количества}) за
+    постоянное число запросов.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not user_ids or not deltas:
+        return
+    lock_users(user_ids)
+    items = {
+        (item.user_id, item.ingredient_id, item.unit): item
+        for item in ShoppingCartItem.objects.filter(
+            user__in=user_ids,
+            ingredient__in={ingredient_id for ingredient_id, _ in deltas},
+        )
+    }
+    changed, created, emptied = [], [], []
+    for user_id in user_ids:
+        for (ingredient_id, unit), delta in deltas.items():
+            item = items.get((user_id, ingredient_id, unit))
+            if item is None:
+                if delta > 0:
+                    created.append(ShoppingCartItem(
+                        user_id=user_id, ingredient_id=ingredient_id,
+                        unit=unit, amount=delta,
+                    ))
+            elif item.amount + delta > 0:
+                item.amount += delta
+                changed.append(item)
+            else:
+                emptied.append(item.id)
+    if emptied:
+        ShoppingCartItem.objects.filter(id__in=emptied).delete()
+    if changed:
+        ShoppingCartItem.objects.bulk_update(
+            changed, ('amount',), batch_size=BATCH_SIZE
+        )
+    if created:
+        ShoppingCartItem.objects.bulk_create(created, batch_size=BATCH_SIZE)
+
+
+@transaction.atomic(savepoint=False)
+def add_recipes(user_id, recipe_ids):
+    lock_recipes(recipe_ids)
+    apply_deltas([user_id], get_recipe_amounts(recipe_ids))
+
+
+@transaction.atomic(savepoint=False)
+def remove_recipes(user_id, recipe_ids):
+    lock_recipes(recipe_ids)
+    apply_deltas([user_id], {
+        key: -total for key, total in get_recipe_amounts(recipe_ids).items()
+    })
+
+
+def change_recipe(recipe_id, deltas):
+    """
+    Применяет изменение ингредиентов рецепта к спискам покупок с ним.
+    Рецепт должен быть заблокирован lock_recipes до чтения строк, из
+    которых посчитаны deltas.
+    """
+    apply_deltas(
+        list(
+            ShoppingList.objects.filter(recipe_id=recipe_id).values_list(
+                'user_id', flat=True
+            )
+        ),
+        deltas,
+    )
+
+
+@transaction.atomic(savepoint=False)
+def rebuild_carts(user_ids):
+    """Пересобирает списки покупок пользователей user_ids по ShoppingList."""
+    lock_users(user_ids)
+    ShoppingCartItem.objects.filter(user__in=user_ids).delete()
+    totals = units.sum_amounts(get_lines(
+        IngredientInRecipe.objects.filter(
+            recipe_parent__shop_list__user__in=user_ids
+        ),
+        'recipe_parent__shop_list__user',
+    ))
+    ShoppingCartItem.objects.bulk_create(
+        (
+            ShoppingCartItem(
+                user_id=user_id, ingredient_id=ingredient_id, unit=unit,
+                amount=total,
+            )
+            for (user_id, ingredient_id, unit), total in totals.items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def rebuild_recipe_carts(recipe_id):
+    """Пересобирает списки покупок, в которых есть рецепт recipe_id."""
+    rebuild_carts(list(
+        ShoppingList.objects.filter(recipe_id=recipe_id).values_list(
+            'user_id', flat=True
+        )
+    ))
+
+
+def rebuild_ingredient_carts(ingredient_ids):
+    """
+    Пересобирает списки покупок с ингредиентами ingredient_ids, например
+    после изменения их плотности или единицы измерения.
+    """
+    rebuild_carts(list(
+        ShoppingList.objects.filter(
+            recipe__recipe_ingredients__ingredient__in=ingredient_ids
+        ).values_list('user_id', flat=True).distinct()
+    ))
@@ -0,0 +1,467 @@
+import csv
+import io
+import json
+import re
+from collections import defaultdict
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from . import cart, units, versions
+from .models import Ingredient, IngredientInRecipe, Recipe, ShoppingList, Tag
+from .signals import count_subquery, counters_disabled, recount_ingredients
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+JSON_CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+COPY_TABLE = 'load_data_batch'
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+def read_json(file):
+    """
+    Элементы JSON-массива по одному: файл читается кусками по
+    JSON_CHUNK_SIZE и целиком в память не загружается.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(JSON_CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValidationError('Ожидается JSON-массив объектов.')
+    position = 1
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise ValidationError('Некорректный JSON-массив.')
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield item
+
+
+def read_json_lines(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'jsonl': read_json_lines}
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def get_fields(row):
+    """Поля строки; поддерживается и формат фикстур Django (fields)."""
+    if not isinstance(row, dict):
+        raise ValidationError('Ожидается объект.')
+    return row['fields'] if isinstance(row.get('fields'), dict) else row
+
+
+def clean_values(model, row, fields, required=()):
+    """
+    Значения полей fields из row, приведённые к типам полей model.
+    Валидаторы полей не запускаются, как и при прежней загрузке через
+    bulk_create: названия из data/ingredients.csv их не проходят.
+    """
+    missing = [name for name in required if row.get(name) in (None, '')]
+    if missing:
+        raise ValidationError(f'Не заполнены поля: {", ".join(missing)}.')
+    values = {}
+    for name in fields:
+        if name not in row:
+            continue
+        field = model._meta.get_field(name)
+        value = row[name]
+        if value in (None, '') and field.null:
+            values[name] = None
+            continue
+        values[name] = field.to_python(value)
+    return values
+
+
+class CatalogLoader:
+    """
+    Загрузка справочника с upsert по уникальному полю key. В PostgreSQL
+    пачки загружаются через COPY, если use_copy не выключен.
+    """
+
+    use_copy = True
+
+    def __init__(self, model, key, fields, required):
+        self.model = model
+        self.key = key
+        self.fields = fields
+        self.required = required
+        self.updated = set()
+
+    def clean(self, row):
+        return clean_values(
+            self.model, get_fields(row), self.fields, self.required
+        )
+
+    def load_batch(self, rows, update):
+        rows = list({row[self.key]: row for row in rows}.values())
+        if self.use_copy and connection.vendor == 'postgresql':
+            self.updated.update(self.copy_batch(rows, update))
+            return
+        if not update:
+            self.model.objects.bulk_create(
+                (self.model(**row) for row in rows), ignore_conflicts=True
+            )
+            return
+        existing = self.model.objects.in_bulk(
+            [row[self.key] for row in rows], field_name=self.key
+        )
+        changed, created = [], []
+        for row in rows:
+            obj = existing.get(row[self.key])
+            if obj is None:
+                created.append(self.model(**row))
+            elif any(
+                getattr(obj, name) != value for name, value in row.items()
+            ):
+                for name, value in row.items():
+                    setattr(obj, name, value)
+                changed.append(obj)
+        if changed:
+            self.model.objects.bulk_update(changed, {
+                name for row in rows for name in row if name != self.key
+            })
+            self.updated.update(obj.id for obj in changed)
+        self.model.objects.bulk_create(created, ignore_conflicts=True)
+
+    def copy_batch(self, rows, update):
+        """
+        Загрузка пачки в PostgreSQL: COPY во временную таблицу и один
+        INSERT ... ON CONFLICT из неё. Возвращает id обновлённых строк.
+        """
+        meta = self.model._meta
+        quote = connection.ops.quote_name
+        table = quote(meta.db_table)
+        fields = [
+            name for name in self.fields if any(name in row for row in rows)
+        ]
+        columns = [quote(meta.get_field(name).column) for name in fields]
+        key = quote(meta.get_field(self.key).column)
+        values = [column for column in columns if column != key]
+        conflict = 'DO NOTHING'
+        if update and values:
+            assignments = ', '.join(
+                f'{column} = EXCLUDED.{column}' for column in values
+            )
+            current = ', '.join(f'{table}.{column}' for column in values)
+            excluded = ', '.join(f'EXCLUDED.{column}' for column in values)
+            conflict = (
+                f'({key}) DO UPDATE SET {assignments} '
+                f'WHERE ({current}) IS DISTINCT FROM ({excluded})'
+            )
+        columns = ', '.join(columns)
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            [row.get(name) for name in fields] for row in rows
+        )
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            # Таблица остаётся до конца внешней транзакции, если загрузка
+            # идёт внутри неё.
+            cursor.execute(f'DROP TABLE IF EXISTS {COPY_TABLE}')
+            cursor.execute(
+                f'CREATE TEMP TABLE {COPY_TABLE} ON COMMIT DROP AS '
+                f'SELECT {columns} FROM {table} WITH NO DATA'
+            )
+            cursor.copy_expert(
+                f'COPY {COPY_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT {columns} FROM {COPY_TABLE} '
+                f'ON CONFLICT {conflict} RETURNING id, xmax <> 0'
+            )
+            return [pk for pk, updated in cursor.fetchall() if updated]
+
+    def finish(self):
+        versions.bump(versions.model_name(self.model))
+
+
+class IngredientLoader(CatalogLoader):
+
+    def __init__(self):
+        super().__init__(
+            Ingredient, 'name', ('name', 'measurement_unit', 'density'),
+            ('name', 'measurement_unit'),
+        )
+
+    def finish(self):
+        super().finish()
+        if self.updated:
+            cart.rebuild_ingredient_carts(self.updated)
+
+
+class TagLoader(CatalogLoader):
+
+    def __init__(self):
+        super().__init__(
+            Tag, 'slug', ('name', 'color', 'slug'), ('name', 'color', 'slug')
+        )
+
+
+class RecipeLoader:
+    """
+    Загрузка рецептов с upsert по названию. Автор задаётся email, теги —
+    списком slug, ингредиенты — списком объектов name, amount и
+    необязательной unit. С update перезаписываются только рецепты, у
+    которых отличаются поля, ингредиенты или теги.
+    """
+
+    model = Recipe
+    fields = ('name', 'text', 'cooking_time', 'image')
+
+    def __init__(self):
+        self.authors = set()
+        self.updated = set()
+
+    def clean(self, row):
+        row = get_fields(row)
+        values = clean_values(
+            Recipe, row, self.fields, ('name', 'text', 'cooking_time')
+        )
+        if not row.get('author'):
+            raise ValidationError('Не заполнены поля: author.')
+        values['author'] = row['author']
+        values['tags'] = list(row.get('tags') or ())
+        amount_field = IngredientInRecipe._meta.get_field('amount')
+        values['ingredients'] = {}
+        for item in row.get('ingredients') or ():
+            if not isinstance(item, dict) or not item.get('name'):
+                raise ValidationError('У ингредиента не указано name.')
+            amount = amount_field.to_python(item.get('amount'))
+            amount_field.run_validators(amount)
+            values['ingredients'][item['name']] = (
+                amount, item.get('unit') or ''
+            )
+        return values
+
+    def get_related(self, rows):
+        """Авторы, теги и ингредиенты пачки, по одному запросу на модель."""
+        related = (
+            (User, 'email', {row['author'] for row in rows}, 'авторы'),
+            (Tag, 'slug', {slug for row in rows for slug in row['tags']},
+             'теги'),
+            (Ingredient, 'name',
+             {name for row in rows for name in row['ingredients']},
+             'ингредиенты'),
+        )
+        result = []
+        for model, field, keys, label in related:
+            found = model.objects.in_bulk(keys, field_name=field)
+            missing = sorted(keys - set(found))
+            if missing:
+                raise ValidationError(
+                    f'Не найдены {label}: {", ".join(map(str, missing))}.'
+                )
+            result.append(found)
+        return result
+
+    def get_lines(self, recipe, row, ingredients):
+        for name, (amount, unit) in row['ingredients'].items():
+            ingredient = ingredients[name]
+            if unit and not units.is_convertible(
+                unit, ingredient.measurement_unit, ingredient.density
+            ):
+                raise ValidationError(
+                    f'{recipe.name}: единицу {unit} нельзя перевести в '
+                    f'единицу ингредиента {name}.'
+                )
+            yield IngredientInRecipe(
+                recipe_parent=recipe, ingredient=ingredient, amount=amount,
+                unit=units.line_unit(unit, ingredient.measurement_unit),
+            )
+
+    @staticmethod
+    def get_current(recipes):
+        """
+        Строки ингредиентов {id ингредиента: (количество, единица)} и id
+        тегов существующих рецептов recipes.
+        """
+        lines, tags = defaultdict(dict), defaultdict(set)
+        for recipe_id, ingredient_id, amount, unit in (
+            IngredientInRecipe.objects.filter(
+                recipe_parent__in=recipes
+            ).values_list('recipe_parent', 'ingredient', 'amount', 'unit')
+        ):
+            lines[recipe_id][ingredient_id] = (amount, unit)
+        for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+            recipe__in=recipes
+        ).values_list('recipe', 'tag'):
+            tags[recipe_id].add(tag_id)
+        return lines, tags
+
+    def set_fields(self, recipe, row, author):
+        """Переносит поля row в recipe; возвращает, изменилось ли что-то."""
+        values = {
+            'author_id': author.id,
+            **{name: row[name] for name in self.fields if name in row},
+        }
+        changed = False
+        for name, value in values.items():
+            if getattr(recipe, name) != value:
+                setattr(recipe, name, value)
+                changed = True
+        return changed
+
+    def get_changes(self, rows, recipes, existing, tags, ingredients,
+                    authors):
+        """
+        Строки и теги для записи: новые рецепты и существующие, у которых
+        отличаются поля, ингредиенты или теги. Возвращает их и список
+        изменённых существующих рецептов.
+        """
+        current_lines, current_tags = self.get_current(
+            [recipes[name].id for name in existing]
+        )
+        written, changed = [], []
+        for row in rows:
+            recipe = recipes[row['name']]
+            lines = list(self.get_lines(recipe, row, ingredients))
+            tag_ids = {tags[slug].id for slug in row['tags']}
+            if row['name'] in existing:
+                author_id = recipe.author_id
+                fields_changed = self.set_fields(
+                    recipe, row, authors[row['author']]
+                )
+                if (
+                    not fields_changed
+                    and current_lines[recipe.id] == {
+                        line.ingredient_id: (line.amount, line.unit)
+                        for line in lines
+                    }
+                    and current_tags[recipe.id] == tag_ids
+                ):
+                    continue
+                self.authors.add(author_id)
+                changed.append(recipe)
+            self.authors.add(recipe.author_id)
+            written.append((recipe, lines, tag_ids))
+        return written, changed
+
+    def load_batch(self, rows, update):
+        rows = list({row['name']: row for row in rows}.values())
+        authors, tags, ingredients = self.get_related(rows)
+        existing = set(Recipe.objects.filter(
+            name__in=[row['name'] for row in rows]
+        ).values_list('name', flat=True))
+        if not update:
+            rows = [row for row in rows if row['name'] not in existing]
+        created = [
+            Recipe(
+                author=authors[row['author']],
+                **{name: row[name] for name in self.fields if name in row},
+            )
+            for row in rows if row['name'] not in existing
+        ]
+        for recipe in created:
+            recipe.set_search_vector()
+        Recipe.objects.bulk_create(created)
+        recipes = Recipe.objects.in_bulk(
+            [row['name'] for row in rows], field_name='name'
+        )
+        written, changed = self.get_changes(
+            rows, recipes, existing & set(recipes), tags, ingredients,
+            authors,
+        )
+        if changed:
+            fields = ['author', *self.fields]
+            for recipe in changed:
+                recipe.set_search_vector()
+            if connection.vendor == 'postgresql':
+                fields.append('search_vector')
+            Recipe.objects.bulk_update(changed, fields)
+            with counters_disabled():
+                IngredientInRecipe.objects.filter(
+                    recipe_parent__in=changed
+                ).delete()
+            Recipe.tags.through.objects.filter(recipe__in=changed).delete()
+            self.updated.update(recipe.id for recipe in changed)
+        IngredientInRecipe.objects.bulk_create(
+            line for _, lines, _ in written for line in lines
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+            for recipe, _, tag_ids in written for tag_id in tag_ids
+        )
+        written_ids = [recipe.id for recipe, _, _ in written]
+        recount_ingredients(written_ids)
+
+    def finish(self):
+        User.objects.filter(id__in=self.authors).update(
+            recipes_count=count_subquery(Recipe.objects, 'author')
+        )
+        if self.updated:
+            cart.rebuild_carts(list(
+                ShoppingList.objects.filter(
+                    recipe__in=self.updated
+                ).values_list('user_id', flat=True).distinct()
+            ))
+        versions.bump(
+            versions.model_name(Recipe),
+            versions.model_name(IngredientInRecipe),
+            versions.model_name(User),
+            *map(versions.recipe_name, self.updated),
+            *map(versions.user_name, self.authors),
+        )
+
+
+LOADERS = {
+    'ingredients': IngredientLoader,
+    'tags': TagLoader,
+    'recipes': RecipeLoader,
+}
+
+
+def clean_rows(loader, rows, start):
+    for number, row in enumerate(rows, start):
+        try:
+            yield loader.clean(row)
+        except ValidationError as error:
+            raise ValidationError(
+                f'Запись {number}: {" ".join(error.messages)}'
+            )
+
+
+def load(loader, rows, batch_size=BATCH_SIZE, update=False):
+    """
+    Загружает rows пачками по batch_size, каждую в своей транзакции, и
+    после каждой пачки отдаёт число обработанных записей. Повторная
+    загрузка тех же данных ничего не меняет, с update существующие записи
+    обновляются.
+    """
+    loaded = 0
+    try:
+        for batch in batched(rows, batch_size):
+            with transaction.atomic():
+                loader.load_batch(
+                    list(clean_rows(loader, batch, loaded + 1)), update
+                )
+            loaded += len(batch)
+            yield loaded
+    finally:
+        loader.finish()
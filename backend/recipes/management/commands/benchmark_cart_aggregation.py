@@ -0,0 +1,83 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management import BaseCommand
+
+from recipes import units
+
+INGREDIENT_UNITS = ('г', 'мл', 'шт.', 'кг', 'щепотка')
+LINE_UNITS = {
+    'г': ('', 'кг', 'ст. л.', 'ч. л.', 'стакан'),
+    'мл': ('', 'л', 'ст. л.', 'стакан', 'капля'),
+    'шт.': ('', 'шт'),
+    'кг': ('', 'г'),
+    'щепотка': ('',),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет приведение к базовым единицам и суммирование строк '
+        'списков покупок на синтетических данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lines', type=int, nargs='+', default=[1000, 10000, 100000]
+        )
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def make_lines(self, count, ingredients, users):
+        generator = random.Random(count)
+        catalog = [
+            (
+                ingredient_id,
+                generator.choice(INGREDIENT_UNITS),
+                Decimal('0.9') if generator.random() < 0.2 else None,
+            )
+            for ingredient_id in range(ingredients)
+        ]
+        lines = []
+        for _ in range(count):
+            ingredient_id, ingredient_unit, density = generator.choice(
+                catalog
+            )
+            unit = generator.choice(LINE_UNITS[ingredient_unit])
+            if density and ingredient_unit == 'г':
+                unit = generator.choice(('', 'мл', 'ст. л.'))
+            lines.append((
+                generator.randrange(users), ingredient_id, ingredient_unit,
+                density, Decimal(generator.randint(1, 5000)) / 10, unit,
+            ))
+        return lines, {
+            ingredient_id: ingredient_unit
+            for ingredient_id, ingredient_unit, _ in catalog
+        }
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"строк":>10}{"позиций":>10}{"сумма, мс":>12}'
+            f'{"показ, мс":>12}{"строк/с":>12}'
+        )
+        for count in options['lines']:
+            lines, catalog = self.make_lines(
+                count, options['ingredients'], options['users']
+            )
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                totals = units.sum_amounts(lines)
+            aggregate = (time.perf_counter() - started) / options['repeat']
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                for (_, ingredient_id, unit), total in totals.items():
+                    units.to_display(
+                        total, unit, catalog[ingredient_id], units.DISPLAY_AUTO
+                    )
+            display = (time.perf_counter() - started) / options['repeat']
+            self.stdout.write(
+                f'{count:>10}{len(totals):>10}{aggregate * 1000:>12.2f}'
+                f'{display * 1000:>12.2f}{count / aggregate:>12.0f}'
+            )
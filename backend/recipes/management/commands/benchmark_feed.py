@@ -0,0 +1,101 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Recipe
+from users.models import Follow
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет ленту подписок для пользователей с разным числом '
+        'подписок. Данные создаются во временной транзакции и удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--authors', type=int, nargs='+', default=[1, 100, 5000]
+        )
+        parser.add_argument('--recipes-per-author', type=int, default=3)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def create_reader(self, authors_count, recipes_per_author):
+        prefix = f'feed_benchmark_{authors_count}'
+        reader = User.objects.create(
+            username=f'{prefix}_reader', email=f'{prefix}_reader@example.com'
+        )
+        User.objects.bulk_create((
+            User(
+                username=f'{prefix}_{number}',
+                email=f'{prefix}_{number}@example.com',
+            )
+            for number in range(authors_count)
+        ), batch_size=BATCH_SIZE)
+        authors = list(
+            User.objects.filter(username__startswith=f'{prefix}_').exclude(
+                pk=reader.pk
+            )
+        )
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=author,
+                    name=f'{author.username} {number}',
+                    text='-',
+                    image='recipes/images/benchmark.png',
+                    cooking_time=1,
+                )
+                for author in authors
+                for number in range(recipes_per_author)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        Follow.objects.bulk_create(
+            (Follow(user=reader, author=author) for author in authors),
+            batch_size=BATCH_SIZE,
+        )
+        return reader
+
+    def measure(self, reader, page_size, repeat):
+        queryset = Recipe.objects.feed_for(reader).with_user_flags(
+            reader
+        ).order_by('-pub_date', '-id')
+        first_page = list(queryset[:page_size])
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                first_page = list(queryset[:page_size])
+            first = (time.perf_counter() - started) / repeat
+            last = first_page[-1]
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.filter(pub_date__lt=last.pub_date)[:page_size])
+            next_page = (time.perf_counter() - started) / repeat
+        return first, next_page, len(queries) // (2 * repeat)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"подписок":>10}{"1-я стр., мс":>16}{"след. стр., мс":>18}'
+            f'{"запросов":>10}'
+        )
+        for authors_count in options['authors']:
+            with transaction.atomic():
+                reader = self.create_reader(
+                    authors_count, options['recipes_per_author']
+                )
+                first, next_page, queries = self.measure(
+                    reader, options['page_size'], options['repeat']
+                )
+                transaction.set_rollback(True)
+            self.stdout.write(
+                f'{authors_count:>10}{first * 1000:>16.2f}'
+                f'{next_page * 1000:>18.2f}{queries:>10}'
+            )
@@ -0,0 +1,110 @@
+import base64
+import json
+import time
+import tracemalloc
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пиковое потребление памяти при создании рецепта с '
+        'изображением в base64 и в multipart-запросе. Данные создаются во '
+        'временной транзакции и удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--width', type=int, default=3000)
+        parser.add_argument('--height', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def make_image(self, width, height):
+        image = Image.effect_noise((width, height), 64).convert('RGB')
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', quality=95)
+        return buffer.getvalue()
+
+    def make_request(self, upload_format, image, number, tag, ingredient):
+        factory = APIRequestFactory()
+        name = f'image_benchmark_{upload_format}_{number}'
+        ingredients = [{'id': ingredient.id, 'amount': 1}]
+        if upload_format == 'base64':
+            return factory.post('/api/recipes/', {
+                'name': name,
+                'text': '-',
+                'cooking_time': 1,
+                'tags': [tag.id],
+                'ingredients': ingredients,
+                'image': (
+                    'data:image/jpeg;base64,'
+                    + base64.b64encode(image).decode()
+                ),
+            }, format='json')
+        upload = BytesIO(image)
+        upload.name = 'benchmark.jpg'
+        return factory.post('/api/recipes/', {
+            'name': name,
+            'text': '-',
+            'cooking_time': 1,
+            'tags': [tag.id],
+            'ingredients': json.dumps(ingredients),
+            'image': upload,
+        }, format='multipart')
+
+    def measure(self, request, user):
+        force_authenticate(request, user)
+        view = RecipeViewSet.as_view({'post': 'create'})
+        tracemalloc.start()
+        started = time.perf_counter()
+        response = view(request)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        request.close()
+        if response.status_code != 201:
+            raise ValueError(response.data)
+        Recipe.objects.get(id=response.data['id']).image.delete(save=False)
+        return peak, elapsed
+
+    def handle(self, *args, **options):
+        image = self.make_image(options['width'], options['height'])
+        self.stdout.write(f'Размер изображения: {len(image)} байт')
+        self.stdout.write(
+            f'{"формат":>10}{"пик памяти, МБ":>18}{"время, мс":>12}'
+        )
+        for upload_format in ('base64', 'multipart'):
+            peaks, times = [], []
+            with transaction.atomic():
+                user = User.objects.create(
+                    username='image_benchmark',
+                    email='image_benchmark@example.com',
+                )
+                tag = Tag.objects.create(
+                    name='image benchmark', color='#123456',
+                    slug='image-benchmark',
+                )
+                ingredient = Ingredient.objects.create(
+                    name='image benchmark', measurement_unit='г'
+                )
+                for number in range(options['repeat']):
+                    request = self.make_request(
+                        upload_format, image, number, tag, ingredient
+                    )
+                    peak, elapsed = self.measure(request, user)
+                    peaks.append(peak)
+                    times.append(elapsed)
+                transaction.set_rollback(True)
+            self.stdout.write(
+                f'{upload_format:>10}{max(peaks) / 2 ** 20:>18.2f}'
+                f'{sum(times) / len(times) * 1000:>12.1f}'
+            )
@@ -0,0 +1,48 @@
+import time
+from decimal import Decimal
+
+from django.core.management import BaseCommand
+
+from api.shop_cart import STREAMING_EXPORTS, render_shopping_cart
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время формирования списка покупок в разных форматах'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        cart = [
+            {
+                'ingredient__name': f'ингредиент {number}',
+                'ingredient__measurement_unit': 'г',
+                'ingredient_value': Decimal(number * 10),
+            }
+            for number in range(options['lines'])
+        ]
+        exporters = {'pdf': render_shopping_cart}
+        exporters.update({
+            export_format: (
+                lambda cart, generator=generator: ''.join(generator(cart))
+            )
+            for export_format, (_, generator) in STREAMING_EXPORTS.items()
+        })
+        self.stdout.write(
+            f'{options["lines"]} строк, {options["repeat"]} повторов'
+        )
+        self.stdout.write(
+            f'{"формат":<8}{"мс/запрос":>12}{"CPU мс":>12}{"байт":>10}'
+        )
+        for export_format, exporter in exporters.items():
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            for _ in range(options['repeat']):
+                content = exporter(cart)
+            wall = (time.perf_counter() - wall_start) / options['repeat']
+            cpu = (time.process_time() - cpu_start) / options['repeat']
+            self.stdout.write(
+                f'{export_format:<8}{wall * 1000:>12.2f}{cpu * 1000:>12.2f}'
+                f'{len(content):>10}'
+            )
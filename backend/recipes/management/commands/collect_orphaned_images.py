@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from api.images import VARIANTS_DIR, get_variant_name
+from recipes.models import Recipe
+
+IMAGE_DIRS = ('recipes/images', 'recipe')
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения рецептов и их варианты, на которые не '
+        'ссылается ни один рецепт'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, какие файлы будут удалены',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе указанного числа секунд',
+        )
+
+    def get_referenced(self):
+        images = set(
+            Recipe.objects.exclude(image='').values_list(
+                'image', flat=True
+            ).iterator()
+        )
+        variants = {
+            get_variant_name(image, size, extension)
+            for image in images
+            for size in settings.RECIPE_IMAGE_SIZES
+            for extension in settings.RECIPE_IMAGE_FORMATS
+        }
+        return images, variants
+
+    def iter_files(self, storage, directory):
+        if not storage.exists(directory):
+            return
+        for filename in storage.listdir(directory)[1]:
+            yield f'{directory}/{filename}'
+
+    def collect(self, storage, directories, referenced, options):
+        deadline = timezone.now() - timedelta(seconds=options['min_age'])
+        removed = freed = 0
+        for directory in directories:
+            for name in self.iter_files(storage, directory):
+                if (
+                    name in referenced
+                    or storage.get_modified_time(name) > deadline
+                ):
+                    continue
+                removed += 1
+                freed += storage.size(name)
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    storage.delete(name)
+        return removed, freed
+
+    def handle(self, *args, **options):
+        images, variants = self.get_referenced()
+        image_storage = Recipe._meta.get_field('image').storage
+        removed, freed = self.collect(
+            image_storage, IMAGE_DIRS, images, options
+        )
+        variants_removed, variants_freed = self.collect(
+            image_storage, (VARIANTS_DIR,), variants, options
+        )
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов: {removed + variants_removed}, '
+            f'{(freed + variants_freed) / 2 ** 20:.2f} МБ'
+        ))
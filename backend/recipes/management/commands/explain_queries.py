@@ -0,0 +1,80 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+
+from api.shop_cart import get_ingredients_cart
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Выводит планы выполнения основных запросов API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='email пользователя, от имени которого запросы'
+        )
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='EXPLAIN ANALYZE (только PostgreSQL)'
+        )
+
+    def get_queries(self, user):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        recipes = Recipe.objects.with_user_flags(user)
+        tag = Tag.objects.first()
+        author = Recipe.objects.values_list('author', flat=True).first()
+        queries = {
+            'GET /recipes/': recipes[:page_size],
+            'GET /recipes/?author=': recipes.filter(
+                author__id=author
+            )[:page_size],
+            'GET /recipes/?tags=': recipes.filter(
+                tags__slug=getattr(tag, 'slug', None)
+            )[:page_size],
+            'GET /recipes/?ordering=popular': recipes.order_by(
+                '-favorites_count', '-pub_date'
+            )[:page_size],
+            'GET /recipes/?ordering=trending': recipes.order_by(
+                '-trending_score', '-pub_date'
+            )[:page_size],
+            'GET /recipes/{id}/': recipes.filter(
+                pk=Recipe.objects.values_list('pk', flat=True).first()
+            ),
+            'GET /tags/': Tag.objects.all(),
+            'GET /ingredients/ (trigram)': Ingredient.objects.filter(
+                name__icontains='моло'
+            ),
+        }
+        if not user.is_anonymous:
+            queries.update({
+                'GET /recipes/?is_favorited=1': recipes.filter(
+                    is_favorited=True
+                )[:page_size],
+                'GET /recipes/?is_in_shopping_cart=1': recipes.filter(
+                    is_in_shopping_cart=True
+                )[:page_size],
+                'GET /users/subscriptions/': user.subscribe.all()[
+                    :page_size
+                ],
+                'GET /recipes/download_shopping_cart/': (
+                    get_ingredients_cart(user)
+                ),
+            })
+        return queries
+
+    def handle(self, *args, **options):
+        if options['user']:
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError('Пользователь не найден')
+        else:
+            user = AnonymousUser()
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        for name, queryset in self.get_queries(user).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
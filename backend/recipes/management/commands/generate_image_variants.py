@@ -0,0 +1,52 @@
+from django.core.management import BaseCommand
+from django.db.models import F
+
+from api.images import get_render_args, render_variants, save_variants
+from api.workers import get_executor
+from recipes.models import Recipe
+
+BATCH_SIZE = 20
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии и WebP-варианты изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить варианты и для уже обработанных рецептов',
+        )
+
+    def process_batch(self, batch):
+        futures = [
+            (recipe_id, image_name, get_executor().submit(
+                render_variants, *get_render_args(image_name)
+            ))
+            for recipe_id, image_name in batch
+        ]
+        processed = 0
+        for recipe_id, image_name, future in futures:
+            try:
+                variants = future.result()
+            except Exception as error:
+                self.stderr.write(f'{image_name}: {error}')
+                continue
+            processed += save_variants(recipe_id, image_name, variants)
+        return processed
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['force']:
+            recipes = recipes.exclude(image_variants=F('image'))
+        processed = 0
+        batch = []
+        for recipe in recipes.values_list('id', 'image').iterator():
+            batch.append(recipe)
+            if len(batch) == BATCH_SIZE:
+                processed += self.process_batch(batch)
+                batch = []
+        if batch:
+            processed += self.process_batch(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}'
+        ))
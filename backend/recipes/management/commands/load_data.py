@@ -1,24 +1,88 @@
 import csv
+import json
+import os
+import time
 
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.management import BaseCommand, CommandError
+from django.db import IntegrityError
 
-from recipes.models import Ingredient
+from recipes.loaders import BATCH_SIZE, LOADERS, READERS, load
 
 
 class Command(BaseCommand):
-    help = 'Загружаем csv-файл'
+    help = (
+        'Загружает ингредиенты, теги или рецепты из CSV, JSON или JSON Lines '
+        'пачками с upsert: повторный запуск не создаёт дубликатов. Без '
+        'аргументов загружает data/ingredients.csv.'
+    )
 
-    def handle(self, *args, **kwargs):
-        data_path = settings.BASE_DIR
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+        )
+        parser.add_argument(
+            '--model', choices=sorted(LOADERS),
+            help='Что загружать; по умолчанию определяется по имени файла',
+        )
+        parser.add_argument(
+            '--format', choices=sorted(READERS),
+            help='Формат файла; по умолчанию определяется по расширению',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--update', action='store_true',
+            help='Обновлять существующие записи, а не пропускать их',
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY в PostgreSQL',
+        )
+
+    def get_option(self, value, choices, default, name):
+        value = value or default
+        if value not in choices:
+            raise CommandError(
+                f'Не удалось определить {name} по имени файла, '
+                f'укажите --{name}'
+            )
+        return value
+
+    def handle(self, *args, **options):
+        path = options['path']
+        stem, extension = os.path.splitext(os.path.basename(path))
+        model = self.get_option(options['model'], LOADERS, stem, 'model')
+        file_format = self.get_option(
+            options['format'], READERS, extension.lstrip('.').lower(),
+            'format',
+        )
+        loader = LOADERS[model]()
+        if options['no_copy']:
+            loader.use_copy = False
+        before = loader.model.objects.count()
+        started = time.perf_counter()
+        loaded = 0
         try:
-            with open(
-                f'{data_path}/data/ingredients.csv', 'r', encoding='utf-8'
-            ) as file:
-                reader = csv.DictReader(file)
-                Ingredient.objects.bulk_create(
-                    Ingredient(**data) for data in reader
-                )
-            self.stdout.write(self.style.SUCCESS('Ингредиенты загружен'))
+            with open(path, encoding='utf-8', newline='') as file:
+                for loaded in load(
+                    loader, READERS[file_format](file),
+                    options['batch_size'], options['update'],
+                ):
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'Загружено записей: {loaded}')
         except FileNotFoundError:
-            raise CommandError('Добавьте файл ingredients в директорию data')
+            raise CommandError(f'Файл {path} не найден')
+        except (csv.Error, UnicodeDecodeError, json.JSONDecodeError) as error:
+            raise CommandError(f'Некорректный файл {path}: {error}')
+        except (ValidationError, IntegrityError) as error:
+            messages = getattr(error, 'messages', [str(error)])
+            raise CommandError(' '.join(messages))
+        elapsed = time.perf_counter() - started
+        created = loader.model.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено записей: {loaded} за {elapsed:.2f} с '
+            f'({loaded / elapsed:.0f} записей/с), новых: {created}, '
+            f'обновлено: {len(loader.updated)}'
+        ))
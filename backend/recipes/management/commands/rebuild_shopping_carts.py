@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db.models import Q
+
+from recipes.cart import rebuild_carts
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает сводные списки покупок по ShoppingList'
+
+    def handle(self, *args, **options):
+        user_ids = list(
+            User.objects.filter(
+                Q(shop_list__isnull=False)
+                | Q(shopping_cart_items__isnull=False)
+            ).distinct().order_by('id').values_list('id', flat=True)
+        )
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            rebuild_carts(user_ids[start:start + BATCH_SIZE])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано списков покупок: {len(user_ids)}'
+        ))
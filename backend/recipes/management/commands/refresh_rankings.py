@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from recipes.ranking import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = 'Обновляет предрасчитанный рейтинг рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать рейтинг с нуля'
+        )
+
+    def handle(self, *args, **options):
+        updated = refresh_rankings(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлён рейтинг рецептов: {updated}'
+        ))
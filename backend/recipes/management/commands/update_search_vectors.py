@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+from django.db import connection
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Заполняет поисковые векторы рецептов (только PostgreSQL)'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(
+                'Поисковые векторы используются только в PostgreSQL'
+            ))
+            return
+        updated = Recipe.objects.update_search_vectors()
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рецептов: {updated}'
+        ))
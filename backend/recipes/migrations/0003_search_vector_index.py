@@ -0,0 +1,36 @@
+from django.db import migrations
+
+SEARCH_VECTOR_INDEX = 'recipes_recipe_search_vector_idx'
+# Раньше создавался post_migrate-обработчиком вместе с расширением
+# pg_trgm; автодополнение ингредиентов теперь ищет по индексу в памяти.
+TRIGRAM_INDEX = 'recipes_ingredient_name_trgm_idx'
+
+
+def create_search_vector_index(apps, schema_editor):
+    """GIN-индекс для полнотекстового поиска; есть только в PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {SEARCH_VECTOR_INDEX} '
+        'ON recipes_recipe USING gin (search_vector)'
+    )
+    schema_editor.execute(f'DROP INDEX IF EXISTS {TRIGRAM_INDEX}')
+
+
+def drop_search_vector_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_VECTOR_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            create_search_vector_index, drop_search_vector_index
+        ),
+    ]
@@ -1,13 +1,73 @@
+from decimal import Decimal
+
 from colorfield.fields import ColorField
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchVectorField
+)
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, connections, models, router
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    Exists,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    Func,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Q,
+    TextField,
+    Value,
+    When,
+    Window
+)
+from django.db.models.functions import Cast, Greatest, RowNumber
+from django.utils import timezone
 
+from users.models import Follow
 from users.validators import name_validator
 
+from .storage import recipe_image_storage
+from .units import format_amount
+
 User = get_user_model()
 
+SEARCH_FIELDS = {'name', 'text'}
+
+
+def search_vector(name, text):
+    """Поисковый вектор рецепта: название весит больше описания."""
+    return (
+        SearchVector(name, weight='A', config=settings.SEARCH_CONFIG)
+        + SearchVector(text, weight='B', config=settings.SEARCH_CONFIG)
+    )
+
+
+SEARCH_VECTOR = search_vector('name', 'text')
+
+
+class Casefold(Func):
+    """
+    Строка в нижнем регистре с учётом Unicode. Встроенный LOWER в SQLite
+    меняет только ASCII, поэтому там вызывается CASEFOLD, который
+    регистрирует recipes.signals.register_sqlite_functions.
+    """
+    function = 'LOWER'
+    output_field = TextField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, function='CASEFOLD', **extra_context
+        )
+
 
 class Tag(models.Model):
     """Класс тегов"""
@@ -52,6 +112,15 @@ class Ingredient(models.Model):
         max_length=20,
         verbose_name='Единицы измерения'
     )
+    density = models.DecimalField(
+        verbose_name='Плотность, г/мл',
+        max_digits=6,
+        decimal_places=3,
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(Decimal('0.001'))],
+        help_text='Для перевода объёма в массу и обратно.',
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
@@ -68,7 +137,7 @@ class IngredientInRecipe(models.Model):
         'Recipe',
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
-        related_name='+'
+        related_name='recipe_ingredients'
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -76,20 +145,33 @@ class IngredientInRecipe(models.Model):
         verbose_name='Название ингредиента в рецепте',
         related_name='+',
     )
-    amount = models.PositiveSmallIntegerField(
+    amount = models.DecimalField(
         verbose_name='Количество ингредиента в рецепте',
-        default='г',
+        max_digits=10,
+        decimal_places=3,
         validators=[
             MinValueValidator(
-                1,
-                message='Количество ингредиентов не может быть меньше 1.'
+                Decimal('0.001'),
+                message='Количество ингредиента должно быть больше нуля.'
             ),
         ]
     )
+    unit = models.CharField(
+        verbose_name='Единица измерения',
+        max_length=20,
+        blank=True,
+        help_text='Если не указана, используется единица ингредиента.',
+    )
 
     class Meta:
         verbose_name = 'Количество ингредиента в рецепте'
         verbose_name_plural = 'Количество ингредиентов в рецептах'
+        indexes = [
+            models.Index(
+                fields=['recipe_parent', 'ingredient', 'amount'],
+                name='recipe_ingredient_amount_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['ingredient', 'recipe_parent'],
@@ -100,9 +182,132 @@ class IngredientInRecipe(models.Model):
     def __str__(self) -> str:
         return (
             f"{self.ingredient} в рецепте {self.recipe_parent} - "
-            f"{self.amount} {self.ingredient.measurement_unit}"
+            f"{format_amount(self.amount)} "
+            f"{self.unit or self.ingredient.measurement_unit}"
+        )
+
+
+class RecipeQuerySet(models.QuerySet):
+    """ Запросы к рецептам без N+1 при сериализации. """
+
+    @staticmethod
+    def prefetch_lookups():
+        return (
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ),
         )
 
+    def with_user_flags(self, user):
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(
+                    False, output_field=BooleanField()
+                ),
+                is_author_subscribed=Value(
+                    False, output_field=BooleanField()
+                ),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_author_subscribed=Exists(Follow.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        )
+
+    def feed_for(self, user):
+        """Рецепты авторов, на которых подписан user."""
+        return self.filter(
+            author__in=Follow.objects.filter(user=user).values('author')
+        )
+
+    def search(self, text):
+        """
+        Полнотекстовый поиск по названию и описанию с сортировкой по
+        релевантности. В PostgreSQL используется заранее вычисленный
+        search_vector, в остальных базах — поиск подстроки без учёта
+        регистра, в том числе кириллицы.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            query = SearchQuery(text, config=settings.SEARCH_CONFIG)
+            return self.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query)
+            ).order_by('-search_rank', '-pub_date')
+        text = text.casefold()
+        return self.annotate(
+            name_folded=Casefold('name'),
+            text_folded=Casefold('text'),
+        ).filter(
+            Q(name_folded__contains=text) | Q(text_folded__contains=text)
+        ).annotate(
+            search_rank=Case(
+                When(name_folded__contains=text, then=2),
+                default=1,
+                output_field=IntegerField(),
+            )
+        ).order_by('-search_rank', '-pub_date')
+
+    def by_ingredients(self, ingredient_ids):
+        """
+        Рецепты хотя бы с одним ингредиентом из ingredient_ids по убыванию
+        доли своих ингредиентов, которые есть в списке, затем по числу
+        совпавших и по id. Совпадения считаются одним GROUP BY по строкам
+        с этими ингредиентами (индекс recipe_ingredient_unique начинается
+        с ингредиента), доля - по счётчику ingredients_count.
+        """
+        return self.filter(
+            recipe_ingredients__ingredient_id__in=ingredient_ids
+        ).annotate(
+            ingredients_matched=Count('recipe_ingredients', distinct=True),
+        ).annotate(
+            ingredients_coverage=ExpressionWrapper(
+                Cast('ingredients_matched', FloatField())
+                / Greatest('ingredients_count', 'ingredients_matched'),
+                output_field=FloatField(),
+            )
+        ).order_by('-ingredients_coverage', '-ingredients_matched', '-id')
+
+    def update_search_vectors(self):
+        """Пересчитывает search_vector; вне PostgreSQL ничего не делает."""
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=SEARCH_VECTOR)
+
+    def latest_by_author(self, author_ids, limit=None):
+        """
+        Последние рецепты каждого автора из author_ids одним запросом:
+        не более limit рецептов на автора, нумерация через ROW_NUMBER().
+        """
+        recipes = {author_id: [] for author_id in author_ids}
+        if not recipes:
+            return recipes
+        queryset = self.filter(author__in=author_ids).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('author')],
+                order_by=[F('pub_date').desc(), F('id').desc()],
+            )
+        ).order_by()
+        sql, params = queryset.query.sql_with_params()
+        sql = f'SELECT * FROM ({sql}) AS ranked'
+        if limit is not None:
+            sql += ' WHERE ranked.row_number <= %s'
+            params = (*params, limit)
+        sql += ' ORDER BY ranked.author_id, ranked.row_number'
+        for recipe in self.model.objects.raw(sql, params):
+            recipes[recipe.author_id].append(recipe)
+        return recipes
+
 
 class Recipe(models.Model):
     """ Модель рецептов. """
@@ -117,7 +322,14 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         verbose_name='Фото',
-        upload_to='recipes/images'
+        upload_to='recipes/images',
+        storage=recipe_image_storage,
+    )
+    image_variants = models.CharField(
+        verbose_name='Изображение, для которого построены варианты',
+        max_length=100,
+        blank=True,
+        editable=False,
     )
     text = models.TextField(
         verbose_name='Описание рецепта'
@@ -155,15 +367,81 @@ class Recipe(models.Model):
             "Не может быть меньше минуты!"
         ),
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Кол-во добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    ingredients_count = models.PositiveIntegerField(
+        verbose_name='Кол-во ингредиентов',
+        default=0,
+        editable=False,
+    )
+    trending_score = models.FloatField(
+        verbose_name='Рейтинг популярности',
+        help_text='Пересчитывается командой refresh_rankings.',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-pub_date'],
+                name='recipe_favorites_count_idx'
+            ),
+            models.Index(
+                fields=['-trending_score', '-pub_date'],
+                name='recipe_trending_score_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Поисковый вектор пишется тем же INSERT или UPDATE, что и текст."""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or SEARCH_FIELDS & set(update_fields):
+            using = kwargs.get('using') or router.db_for_write(
+                type(self), instance=self
+            )
+            if self.set_search_vector(using) and update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'search_vector'}
+        super().save(*args, **kwargs)
+
+    def set_search_vector(self, using=DEFAULT_DB_ALIAS):
+        """
+        Ставит в search_vector выражение от текущих name и text. Оно не
+        ссылается на столбцы, поэтому годится и для save, и для
+        bulk_create и bulk_update. Вне PostgreSQL ничего не делает и
+        возвращает False.
+        """
+        if connections[using].vendor != 'postgresql':
+            return False
+        self.search_vector = search_vector(
+            Value(self.name, output_field=TextField()),
+            Value(self.text, output_field=TextField()),
+        )
+        return True
+
 
 class Favorite(models.Model):
     """Класс избранное"""
@@ -180,10 +458,20 @@ class Favorite(models.Model):
         verbose_name='Рецепт',
         related_name='favoriting',
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        default=timezone.now,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='favorite_recipe_user_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'recipe'], name='unique_favorite'
@@ -209,10 +497,20 @@ class ShoppingList(models.Model):
         verbose_name='Рецепт',
         related_name='shop_list',
     )
+    created = models.DateTimeField(
+        verbose_name='Дата добавления',
+        default=timezone.now,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='shoppinglist_recipe_user_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'recipe'], name='unique_shoppingList'
@@ -221,3 +519,148 @@ class ShoppingList(models.Model):
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
+
+
+class ShoppingCartItem(models.Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+    Поддерживается при изменении ShoppingList и ингредиентов рецептов.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_items',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент',
+    )
+    amount = models.DecimalField(
+        verbose_name='Количество',
+        max_digits=12,
+        decimal_places=3,
+    )
+    unit = models.CharField(
+        verbose_name='Базовая единица измерения',
+        max_length=20,
+    )
+
+    class Meta:
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient', 'unit'],
+                name='unique_shopping_cart_item',
+            ),
+        ]
+
+    def __str__(self):
+        return (
+            f'{self.user} {self.ingredient}: '
+            f'{format_amount(self.amount)} {self.unit}'
+        )
+
+
+class RecipeRanking(models.Model):
+    """
+    Накопленная часть рейтинга рецепта. base_score - log2 суммы добавлений
+    в избранное и список покупок, созданных не позже updated, каждое из
+    которых затухает вдвое за RANKING_HALF_LIFE и отсчитывается от
+    RANKING_EPOCH. Логарифм позволяет добавлять новые события, не
+    пересчитывая затухание у остальных рецептов. Итоговый рейтинг для
+    сортировки хранится в Recipe.trending_score.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Рецепт',
+    )
+    base_score = models.FloatField(
+        verbose_name='Накопленный рейтинг',
+    )
+    updated = models.DateTimeField(
+        verbose_name='Учтены события до',
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+
+    def __str__(self):
+        return f'{self.recipe} {self.base_score:.2f}'
+
+
+class ShoppingCartExport(models.Model):
+    """Фоновая выгрузка списка покупок в PDF"""
+
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'В обработке'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_exports',
+        verbose_name='Пользователь',
+    )
+    status = models.CharField(
+        verbose_name='Статус',
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    file = models.FileField(
+        verbose_name='Файл',
+        upload_to='shopping_carts',
+        blank=True,
+    )
+    created = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Выгрузка списка покупок'
+        verbose_name_plural = 'Выгрузки списков покупок'
+
+    def __str__(self):
+        return f'{self.user} {self.created:%d.%m.%Y %H:%M} {self.status}'
+
+
+class Version(models.Model):
+    """
+    Версия данных для ETag и кешей. Хранится в базе, чтобы изменения из
+    любого процесса (воркеров gunicorn, management-команд, фоновых задач)
+    были видны всем остальным.
+    """
+
+    name = models.CharField(
+        verbose_name='Имя',
+        max_length=100,
+        primary_key=True,
+    )
+    value = models.BigIntegerField(
+        verbose_name='Версия',
+    )
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
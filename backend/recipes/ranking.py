@@ -0,0 +1,116 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import versions
+from .models import Favorite, Recipe, RecipeRanking, ShoppingList
+
+BATCH_SIZE = 1000
+
+
+def get_epoch():
+    epoch = parse_datetime(settings.RANKING_EPOCH)
+    if settings.USE_TZ and timezone.is_naive(epoch):
+        return timezone.make_aware(epoch)
+    if not settings.USE_TZ and timezone.is_aware(epoch):
+        return timezone.make_naive(epoch)
+    return epoch
+
+
+def log2_add(first, second):
+    """log2(2 ** first + 2 ** second) без переполнения."""
+    if first is None:
+        return second
+    high, low = max(first, second), min(first, second)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def collect_scores(since, until):
+    """Вклад событий из интервала (since, until] в рейтинг рецептов."""
+    epoch = get_epoch()
+    half_life = settings.RANKING_HALF_LIFE
+    sources = (
+        (Favorite, settings.RANKING_FAVORITE_WEIGHT),
+        (ShoppingList, settings.RANKING_SHOPPING_LIST_WEIGHT),
+    )
+    scores = defaultdict(lambda: None)
+    for model, weight in sources:
+        events = model.objects.filter(created__lte=until)
+        if since is not None:
+            events = events.filter(created__gt=since)
+        for recipe_id, created in events.values_list(
+            'recipe_id', 'created'
+        ).iterator():
+            score = (
+                (created - epoch).total_seconds() / half_life
+                + math.log2(weight)
+            )
+            scores[recipe_id] = log2_add(scores[recipe_id], score)
+    return scores
+
+
+@transaction.atomic
+def refresh_rankings(full=False):
+    """
+    Добавляет в рейтинг события, появившиеся после предыдущего обновления.
+    События старше RANKING_OVERLAP копятся в RecipeRanking.base_score, а
+    более новые пересчитываются каждый раз, поэтому событие с более ранним
+    created, зафиксированное после обновления, не теряется. При full=True
+    рейтинг пересчитывается с нуля, что также учитывает удалённые из
+    избранного и списка покупок рецепты.
+    Возвращает количество обновлённых рецептов.
+    """
+    now = timezone.now()
+    mark = now - timedelta(seconds=settings.RANKING_OVERLAP)
+    if full:
+        RecipeRanking.objects.all().delete()
+        Recipe.objects.exclude(trending_score=0).update(trending_score=0)
+        since = None
+    else:
+        since = RecipeRanking.objects.aggregate(Max('updated'))[
+            'updated__max'
+        ]
+        if since is not None:
+            mark = max(mark, since)
+    base = collect_scores(since, mark)
+    recent = collect_scores(mark, now)
+    rankings = RecipeRanking.objects.in_bulk(list({**base, **recent}))
+    to_update, to_create = [], []
+    for recipe_id, score in base.items():
+        ranking = rankings.get(recipe_id)
+        if ranking is None:
+            ranking = rankings[recipe_id] = RecipeRanking(
+                recipe_id=recipe_id, base_score=score, updated=mark
+            )
+            to_create.append(ranking)
+        else:
+            ranking.base_score = log2_add(ranking.base_score, score)
+            ranking.updated = mark
+            to_update.append(ranking)
+    RecipeRanking.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    RecipeRanking.objects.bulk_update(
+        to_update, ('base_score', 'updated'), batch_size=BATCH_SIZE
+    )
+    scores = {
+        recipe_id: ranking.base_score
+        for recipe_id, ranking in rankings.items()
+    }
+    for recipe_id, score in recent.items():
+        scores[recipe_id] = log2_add(scores.get(recipe_id), score)
+    Recipe.objects.bulk_update(
+        [
+            Recipe(id=recipe_id, trending_score=score)
+            for recipe_id, score in scores.items()
+        ],
+        ('trending_score',),
+        batch_size=BATCH_SIZE,
+    )
+    if scores or full:
+        versions.bump(versions.model_name(RecipeRanking))
+    return len(scores)
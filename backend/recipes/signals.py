@@ -0,0 +1,299 @@
+from contextlib import contextmanager
+from threading import local
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_migrate,
+    post_save,
+    pre_delete
+)
+from django.dispatch import receiver
+
+from api.images import start_image_variants
+from users.models import Follow
+
+from . import cart, versions
+from .models import (
+    Favorite,
+    Ingredient,
+    IngredientInRecipe,
+    Recipe,
+    ShoppingList,
+    Tag
+)
+
+User = get_user_model()
+
+
+def casefold(value):
+    return None if value is None else value.casefold()
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs):
+    """CASEFOLD для models.Casefold: LOWER в SQLite знает только ASCII."""
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('CASEFOLD', 1, casefold)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def bump_model_version(sender, **kwargs):
+    versions.bump(versions.model_name(sender))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def bump_recipe_version(sender, instance, **kwargs):
+    versions.bump(
+        versions.model_name(Recipe), versions.recipe_name(instance.id)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_image_variants(sender, instance, **kwargs):
+    """
+    После коммита отправляет построение вариантов нового изображения в
+    фоновый пул; файл читается уже там.
+    """
+    if not instance.image or instance.image_variants == instance.image.name:
+        return
+    recipe_id, image_name = instance.id, instance.image.name
+    transaction.on_commit(
+        lambda: start_image_variants(recipe_id, image_name)
+    )
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def bump_recipe_ingredients_version(sender, instance, **kwargs):
+    versions.bump(
+        versions.model_name(IngredientInRecipe),
+        versions.recipe_name(instance.recipe_parent_id),
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_version(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """
+    tag.recipe_set.clear() не передаёт pk_set, поэтому затронутые рецепты
+    запоминаются в pre_clear и используются в post_clear.
+    """
+    if reverse and action == 'pre_clear':
+        instance._cleared_recipe_ids = list(
+            sender.objects.filter(tag=instance).values_list(
+                'recipe_id', flat=True
+            )
+        )
+    if not action.startswith('post_'):
+        return
+    if reverse and action == 'post_clear':
+        recipe_ids = getattr(instance, '_cleared_recipe_ids', ())
+    elif reverse:
+        recipe_ids = pk_set or ()
+    else:
+        recipe_ids = (instance.id,)
+    versions.bump(
+        versions.model_name(Recipe),
+        *(versions.recipe_name(recipe_id) for recipe_id in recipe_ids),
+    )
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_version(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    versions.bump(versions.model_name(User), versions.user_name(instance.id))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingList)
+@receiver(post_delete, sender=ShoppingList)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_user_state_version(sender, instance, **kwargs):
+    versions.bump(versions.user_state_name(instance.user_id))
+
+
+_state = local()
+
+
+@contextmanager
+def counters_disabled():
+    """
+    Отключает обработчики счётчиков и сводных списков покупок в текущем
+    потоке: массовые операции пересчитывают их сами за несколько запросов.
+    """
+    _state.counters_disabled = True
+    try:
+        yield
+    finally:
+        _state.counters_disabled = False
+
+
+def are_counters_disabled():
+    return getattr(_state, 'counters_disabled', False)
+
+
+def change_counter(model, pk, field, delta):
+    """
+    Атомарно изменяет счётчик field у объекта model на delta, не опуская
+    его ниже нуля.
+    """
+    if are_counters_disabled():
+        return
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def count_subquery(queryset, field):
+    """Подзапрос с количеством строк queryset для OuterRef('pk')."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def recount_counters(using='default'):
+    """
+    Пересчитывает счётчики избранного, ингредиентов, рецептов и
+    подписчиков по данным.
+    Возвращает число обновлённых рецептов и пользователей.
+    """
+    recipes = Recipe.objects.using(using).update(
+        favorites_count=count_subquery(Favorite.objects, 'recipe'),
+        ingredients_count=count_subquery(
+            IngredientInRecipe.objects, 'recipe_parent'
+        ),
+    )
+    users = User.objects.using(using).update(
+        recipes_count=count_subquery(Recipe.objects, 'author'),
+        followers_count=count_subquery(Follow.objects, 'author'),
+    )
+    return recipes, users
+
+
+@receiver(post_migrate)
+def recount_counters_after_migrate(sender, using, **kwargs):
+    """
+    Заполняет счётчики после миграций: новые столбцы создаются с нулём, и
+    без пересчёта первое же уменьшение упиралось бы в ноль.
+    """
+    if sender.name == 'recipes':
+        recount_counters(using)
+
+
+def recount_favorites(recipe_ids):
+    """Пересчитывает favorites_count рецептов recipe_ids одним запросом."""
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        favorites_count=count_subquery(Favorite.objects, 'recipe')
+    )
+
+
+def recount_ingredients(recipe_ids):
+    """Пересчитывает ingredients_count рецептов recipe_ids одним запросом."""
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        ingredients_count=count_subquery(
+            IngredientInRecipe.objects, 'recipe_parent'
+        )
+    )
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def increment_ingredients_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe, instance.recipe_parent_id, 'ingredients_count', 1
+        )
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def decrement_ingredients_count(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_parent_id, 'ingredients_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_followers_count(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'followers_count', -1)
+
+
+@receiver(m2m_changed, sender=Follow)
+def follow_added_through_m2m(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """
+    User.subscribe.add() создаёт подписки через bulk_create без post_save.
+    Удаление через remove() проходит через post_delete.
+    """
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        change_counter(User, instance.id, 'followers_count', len(pk_set))
+        versions.bump(*map(versions.user_state_name, pk_set))
+    else:
+        User.objects.filter(pk__in=pk_set).update(
+            followers_count=F('followers_count') + 1
+        )
+        versions.bump(versions.user_state_name(instance.id))
+
+
+@receiver(post_save, sender=ShoppingList)
+def add_to_shopping_cart_items(sender, instance, created, **kwargs):
+    if created and not are_counters_disabled():
+        cart.add_recipes(instance.user_id, [instance.recipe_id])
+
+
+@receiver(pre_delete, sender=ShoppingList)
+def remove_from_shopping_cart_items(sender, instance, **kwargs):
+    """
+    Вызывается до удаления, пока ингредиенты рецепта ещё на месте, в том
+    числе при каскадном удалении самого рецепта.
+    """
+    if not are_counters_disabled():
+        cart.remove_recipes(instance.user_id, [instance.recipe_id])
@@ -0,0 +1,51 @@
+import hashlib
+import os
+import posixpath
+from uuid import uuid4
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла — SHA-256 его содержимого. Повторная
+    загрузка того же файла возвращает уже сохранённый файл и обновляет
+    время его изменения, чтобы collect_orphaned_images с --min-age не
+    удалил файл до сохранения ссылающегося на него рецепта.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest.hexdigest() + extension)
+
+    def _save(self, name, content):
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return self.replace(name, content)
+
+    def replace(self, name, content):
+        """
+        Атомарно записывает content под именем name без замены имени на
+        хеш: так сохраняются варианты изображений, имя которых задаёт
+        исходное изображение.
+        """
+        temporary_name = super()._save(
+            posixpath.join(posixpath.dirname(name), f'.{uuid4().hex}.tmp'),
+            content,
+        )
+        os.replace(self.path(temporary_name), self.path(name))
+        return name
+
+
+recipe_image_storage = ContentAddressedStorage()
@@ -0,0 +1,143 @@
+from collections import defaultdict
+from decimal import Decimal
+from typing import NamedTuple
+
+MASS = 'mass'
+VOLUME = 'volume'
+COUNT = 'count'
+
+PRECISION = Decimal('0.001')
+
+
+class Unit(NamedTuple):
+    name: str
+    dimension: str
+    factor: Decimal
+
+
+UNITS = {
+    unit.name: unit for unit in (
+        Unit('мг', MASS, Decimal('0.001')),
+        Unit('г', MASS, Decimal(1)),
+        Unit('кг', MASS, Decimal(1000)),
+        Unit('капля', VOLUME, Decimal('0.05')),
+        Unit('мл', VOLUME, Decimal(1)),
+        Unit('ч. л.', VOLUME, Decimal(5)),
+        Unit('ст. л.', VOLUME, Decimal(15)),
+        Unit('стакан', VOLUME, Decimal(250)),
+        Unit('л', VOLUME, Decimal(1000)),
+        Unit('шт.', COUNT, Decimal(1)),
+    )
+}
+ALIASES = {
+    'гр': 'г',
+    'гр.': 'г',
+    'г.': 'г',
+    'кг.': 'кг',
+    'мл.': 'мл',
+    'л.': 'л',
+    'шт': 'шт.',
+    'ч.л.': 'ч. л.',
+    'ст.л.': 'ст. л.',
+}
+BASE_UNITS = {MASS: 'г', VOLUME: 'мл', COUNT: 'шт.'}
+LARGE_UNITS = {MASS: 'кг', VOLUME: 'л'}
+
+DISPLAY_INGREDIENT = 'ingredient'
+DISPLAY_BASE = 'base'
+DISPLAY_AUTO = 'auto'
+DISPLAY_MODES = (DISPLAY_INGREDIENT, DISPLAY_BASE, DISPLAY_AUTO)
+
+
+def get_unit(name):
+    """
+    Единица измерения по названию. Неизвестные единицы (щепотка, пучок,
+    по вкусу) образуют отдельное измерение и складываются только между
+    собой.
+    """
+    unit = UNITS.get(name)
+    if unit is not None:
+        return unit
+    name = ' '.join(name.split())
+    name = ALIASES.get(name, name)
+    return UNITS.get(name) or Unit(name, name, Decimal(1))
+
+
+def is_convertible(unit, ingredient_unit, density=None):
+    """Можно ли перевести unit в единицу ингредиента ingredient_unit."""
+    source, target = get_unit(unit), get_unit(ingredient_unit)
+    if source.dimension == target.dimension:
+        return True
+    return bool(density) and {source.dimension, target.dimension} == {
+        MASS, VOLUME
+    }
+
+
+def line_unit(unit, ingredient_unit):
+    """
+    Каноническое название единицы строки рецепта; единица самого
+    ингредиента хранится пустой строкой.
+    """
+    unit = get_unit(unit).name if unit else ''
+    return '' if unit == get_unit(ingredient_unit).name else unit
+
+
+def to_base(amount, unit, ingredient_unit, density=None):
+    """
+    Количество в базовой единице (г, мл, шт.) измерения ингредиента:
+    (количество, базовая единица). Объём переводится в массу и обратно по
+    плотности ингредиента, если она задана.
+    """
+    source = get_unit(unit or ingredient_unit)
+    value = amount * source.factor
+    dimension = source.dimension
+    if density and dimension in (MASS, VOLUME):
+        target = get_unit(ingredient_unit).dimension
+        if dimension == VOLUME and target == MASS:
+            value, dimension = value * density, MASS
+        elif dimension == MASS and target == VOLUME:
+            value, dimension = value / density, VOLUME
+    return value.quantize(PRECISION), BASE_UNITS.get(dimension, source.name)
+
+
+def sum_amounts(lines):
+    """
+    Суммирует строки (группа, id ингредиента, единица ингредиента,
+    плотность, количество, единица) за один проход:
+    {(группа, id ингредиента, базовая единица): количество}.
+    """
+    totals = defaultdict(Decimal)
+    for group, ingredient_id, ingredient_unit, density, amount, unit in lines:
+        value, base_unit = to_base(amount, unit, ingredient_unit, density)
+        totals[group, ingredient_id, base_unit] += value
+    return totals
+
+
+def to_display(amount, base_unit, ingredient_unit, mode=DISPLAY_INGREDIENT):
+    """
+    Количество из базовой единицы в единице показа: единице ингредиента
+    (ingredient), базовой (base) или крупной при больших значениях (auto).
+    """
+    unit = get_unit(base_unit)
+    if mode == DISPLAY_INGREDIENT:
+        target = get_unit(ingredient_unit)
+        if target.dimension == unit.dimension:
+            return (amount / target.factor).quantize(PRECISION), target.name
+    elif mode == DISPLAY_AUTO and unit.dimension in LARGE_UNITS:
+        large = UNITS[LARGE_UNITS[unit.dimension]]
+        if amount >= large.factor:
+            return (amount / large.factor).quantize(PRECISION), large.name
+    return amount, base_unit
+
+
+def to_number(amount):
+    """Количество для JSON: целое число, если дробной части нет."""
+    amount = amount.quantize(PRECISION)
+    return int(amount) if amount == amount.to_integral_value() else float(
+        amount
+    )
+
+
+def format_amount(amount):
+    """Количество без лишних нулей после запятой."""
+    return f'{amount.quantize(PRECISION).normalize():f}'
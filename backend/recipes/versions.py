@@ -0,0 +1,80 @@
+import time
+
+from django.db import transaction
+from django.db.models import BigIntegerField, F, Value
+from django.db.models.functions import Greatest
+
+from .models import Version
+
+BATCH_SIZE = 500
+
+
+def model_name(model):
+    return model._meta.label_lower
+
+
+def user_state_name(user_id):
+    """Версия избранного, списка покупок и подписок пользователя."""
+    return f'user_state:{user_id}'
+
+
+def recipe_name(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def user_name(user_id):
+    return f'user:{user_id}'
+
+
+def now():
+    return int(time.time() * 1000)
+
+
+def get_versions(names):
+    """
+    Версии (метки времени в миллисекундах) для списка имён одним запросом.
+    Отсутствующая версия заводится заново текущим временем.
+    """
+    found = dict(
+        Version.objects.filter(name__in=names).values_list('name', 'value')
+    )
+    missing = [name for name in dict.fromkeys(names) if name not in found]
+    if missing:
+        timestamp = now()
+        Version.objects.bulk_create(
+            (Version(name=name, value=timestamp) for name in missing),
+            ignore_conflicts=True,
+        )
+        found.update(
+            Version.objects.filter(name__in=missing).values_list(
+                'name', 'value'
+            )
+        )
+    return [found[name] for name in names]
+
+
+def bump(*names):
+    """
+    Увеличивает версии, делая связанные с ними кеши недействительными.
+    Внутри транзакции версии увеличиваются после её фиксации: до этого
+    другие процессы видят старые данные, а строки версий не остаются
+    заблокированными на всё время транзакции.
+    """
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(names))
+    else:
+        _bump(names)
+
+
+def _bump(names):
+    names = list(dict.fromkeys(names))
+    timestamp = now()
+    for start in range(0, len(names), BATCH_SIZE):
+        batch = names[start:start + BATCH_SIZE]
+        Version.objects.bulk_create(
+            (Version(name=name, value=timestamp) for name in batch),
+            ignore_conflicts=True,
+        )
+        Version.objects.filter(name__in=batch).update(value=Greatest(
+            F('value') + 1, Value(timestamp, output_field=BigIntegerField())
+        ))
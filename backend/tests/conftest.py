@@ -0,0 +1,93 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+
+
+def pytest_collection_modifyitems(items):
+    """Тесты с меткой postgres пропускаются на других базах."""
+    if connection.vendor == 'postgresql':
+        return
+    skip = pytest.mark.skip(reason='нужен PostgreSQL')
+    for item in items:
+        if 'postgres' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def capture_queries():
+    """Запросы к базе внутри блока with."""
+    return lambda: CaptureQueriesContext(connection)
+
+
+@pytest.fixture
+def author(django_user_model):
+    return django_user_model.objects.create_user(
+        email='author@example.com', username='author', password='password',
+        first_name='Автор', last_name='Рецептов',
+    )
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        email='user@example.com', username='user', password='password',
+        first_name='Пользователь', last_name='Сайта',
+    )
+
+
+@pytest.fixture
+def author_client(author):
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def tag():
+    return Tag.objects.create(
+        name='Завтрак', color='#E26C2D', slug='breakfast'
+    )
+
+
+@pytest.fixture
+def ingredients():
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(30)
+    )
+    return list(Ingredient.objects.order_by('id'))
+
+
+@pytest.fixture
+def make_recipe(author, tag, ingredients):
+    """Рецепт автора с первыми count ингредиентами."""
+    def make_recipe(name='Рецепт', count=3, text='Описание'):
+        recipe = Recipe.objects.create(
+            author=author, name=name, text=text, cooking_time=10,
+            image='recipes/images/recipe.png', ingredients_count=count,
+        )
+        recipe.tags.add(tag)
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe_parent=recipe, ingredient=ingredient,
+                amount=number + 1,
+            )
+            for number, ingredient in enumerate(ingredients[:count])
+        )
+        return recipe
+    return make_recipe
+
+
+@pytest.fixture
+def recipes(make_recipe):
+    return [make_recipe(f'Рецепт {number}') for number in range(20)]
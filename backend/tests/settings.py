@@ -0,0 +1,12 @@
+import os
+import tempfile
+
+os.environ.setdefault('SECRET_KEY', 'tests')
+os.environ.setdefault('DB_ENGINE', 'django.db.backends.sqlite3')
+os.environ.setdefault('DB_NAME', 'db.sqlite3')
+
+from foodgram.settings import *  # noqa: E402,F401,F403
+
+ALLOWED_HOSTS = ['testserver']
+INGREDIENT_INDEX_PRELOAD = False
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-tests-')
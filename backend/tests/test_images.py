@@ -0,0 +1,55 @@
+from io import BytesIO
+
+import pytest
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from api import images
+from recipes.models import Recipe
+from recipes.storage import recipe_image_storage
+
+
+@pytest.fixture
+def image_name():
+    buffer = BytesIO()
+    Image.new('RGB', (40, 20), 'red').save(buffer, 'PNG')
+    return recipe_image_storage.save(
+        'recipes/images/recipe.png', ContentFile(buffer.getvalue())
+    )
+
+
+def test_render_variants_reads_image_by_name(image_name):
+    variants = images.render_variants(
+        image_name, {'thumbnail': (10, 10)}, {'webp': 'WEBP'}, 80
+    )
+    with Image.open(BytesIO(variants['thumbnail', 'webp'])) as variant:
+        assert variant.size == (10, 5)
+
+
+def test_start_image_variants_does_not_read_image(monkeypatch, settings):
+    submitted = []
+    monkeypatch.setattr(
+        images, 'submit', lambda func, *args, **kwargs: submitted.append(
+            (func, args)
+        )
+    )
+    images.start_image_variants(1, 'recipes/images/missing.png')
+    assert submitted == [(images.render_variants, (
+        'recipes/images/missing.png', settings.RECIPE_IMAGE_SIZES,
+        settings.RECIPE_IMAGE_FORMATS, settings.RECIPE_IMAGE_QUALITY,
+    ))]
+
+
+@pytest.mark.django_db
+def test_save_variants_keeps_variant_names(make_recipe, image_name):
+    recipe = make_recipe()
+    Recipe.objects.filter(id=recipe.id).update(image=image_name)
+    name = images.get_variant_name(image_name, 'thumbnail', 'webp')
+    for content in (b'old', b'new'):
+        assert images.save_variants(
+            recipe.id, image_name, {('thumbnail', 'webp'): content}
+        )
+        with recipe_image_storage.open(name) as variant:
+            assert variant.read() == content
+    recipe.refresh_from_db()
+    assert recipe.image_variants == image_name
@@ -0,0 +1,81 @@
+import pytest
+from django.db import OperationalError
+
+from api.indexes import IngredientNameIndex
+from recipes import versions
+from recipes.models import Ingredient
+
+NAMES = ('морковь', 'молоко', 'морская соль', 'сок моркови')
+
+
+@pytest.fixture
+def index():
+    Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit='г') for name in NAMES
+    )
+    return IngredientNameIndex()
+
+
+def names(results):
+    return [ingredient['name'] for ingredient in results]
+
+
+@pytest.mark.django_db
+def test_prefix_matches_go_before_substrings(index):
+    assert names(index.search('морк', 10))[:2] == [
+        'морковь', 'сок моркови'
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('query', (
+    'мврк',
+    'мрко',
+    'моррк',
+    'омрк',
+))
+def test_typos_found_for_all_edit_kinds(index, query):
+    assert 'морковь' in names(index.search(query, 10))
+
+
+@pytest.mark.django_db
+def test_far_queries_not_matched(index):
+    assert names(index.search('сахар', 10)) == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_invalidate_reloads_index(index):
+    assert names(index.search('пер', 10)) == []
+    Ingredient.objects.bulk_create(
+        [Ingredient(name='перец', measurement_unit='г')]
+    )
+    assert names(index.search('пер', 10)) == []
+    index.invalidate()
+    assert names(index.search('пер', 10)) == ['перец']
+
+
+@pytest.mark.django_db
+def test_autocomplete_reads_version_once(client, index, capture_queries):
+    client.get('/api/ingredients/', {'name': 'мор'})
+    with capture_queries() as context:
+        response = client.get('/api/ingredients/', {'name': 'мор'})
+    assert response.status_code == 200
+    assert names(response.data)[:2] == ['морковь', 'морская соль']
+    assert len(context.captured_queries) == 1
+
+
+@pytest.mark.django_db
+def test_preload_builds_index(index, django_assert_num_queries):
+    index.preload()
+    with django_assert_num_queries(1):
+        index.search('мор', 10)
+
+
+def test_preload_without_database_does_not_fail(monkeypatch):
+    def fail(names):
+        raise OperationalError('no such table: recipes_version')
+
+    monkeypatch.setattr(versions, 'get_versions', fail)
+    index = IngredientNameIndex()
+    index.preload()
+    assert index._state is None
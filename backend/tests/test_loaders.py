@@ -0,0 +1,107 @@
+import pytest
+
+from recipes.loaders import IngredientLoader, RecipeLoader, load
+from recipes.models import Ingredient, IngredientInRecipe, Recipe
+
+
+def recipe_row(name, amount=100, tags=('breakfast',)):
+    return {
+        'name': name, 'text': 'Описание', 'cooking_time': 10,
+        'image': 'recipes/images/recipe.png', 'author': 'author@example.com',
+        'tags': list(tags),
+        'ingredients': [
+            {'name': 'Ингредиент 0', 'amount': amount},
+            {'name': 'Ингредиент 1', 'amount': 2, 'unit': 'кг'},
+        ],
+    }
+
+
+def run(loader, rows, **kwargs):
+    for _ in load(loader, rows, **kwargs):
+        pass
+    return loader
+
+
+@pytest.fixture
+def loaded(author, tag, ingredients):
+    rows = [recipe_row('Омлет'), recipe_row('Каша')]
+    run(RecipeLoader(), rows)
+    return rows
+
+
+@pytest.mark.django_db
+def test_recipes_loaded_once(loaded):
+    run(RecipeLoader(), loaded)
+    assert Recipe.objects.count() == 2
+    assert IngredientInRecipe.objects.count() == 4
+    assert set(
+        Recipe.objects.values_list('ingredients_count', flat=True)
+    ) == {2}
+
+
+@pytest.mark.django_db
+def test_update_without_changes_writes_nothing(loaded, capture_queries):
+    with capture_queries() as context:
+        loader = run(RecipeLoader(), loaded, update=True)
+    assert loader.updated == set()
+    assert not [
+        query for query in context.captured_queries
+        if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        and 'recipes_version' not in query['sql']
+        and 'users_user' not in query['sql']
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('row', (
+    recipe_row('Омлет', amount=150),
+    recipe_row('Омлет', tags=()),
+    {**recipe_row('Омлет'), 'cooking_time': 15},
+))
+def test_update_rewrites_only_changed_recipes(loaded, row):
+    unchanged = set(IngredientInRecipe.objects.filter(
+        recipe_parent__name='Каша'
+    ).values_list('id', flat=True))
+    loader = run(RecipeLoader(), [row, recipe_row('Каша')], update=True)
+    assert loader.updated == {Recipe.objects.get(name='Омлет').id}
+    assert set(IngredientInRecipe.objects.filter(
+        recipe_parent__name='Каша'
+    ).values_list('id', flat=True)) == unchanged
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('use_copy', (
+    False, pytest.param(True, marks=pytest.mark.postgres),
+))
+def test_ingredient_update_reports_changed_rows(use_copy):
+    rows = [
+        {'name': 'Соль', 'measurement_unit': 'г'},
+        {'name': 'Молоко', 'measurement_unit': 'мл'},
+    ]
+    loader = IngredientLoader()
+    loader.use_copy = use_copy
+    run(loader, rows)
+    assert loader.updated == set()
+    loader = IngredientLoader()
+    loader.use_copy = use_copy
+    run(loader, [
+        rows[0], {'name': 'Молоко', 'measurement_unit': 'л'},
+        {'name': 'Сахар', 'measurement_unit': 'г'},
+    ], batch_size=1, update=True)
+    assert loader.updated == {Ingredient.objects.get(name='Молоко').id}
+    assert dict(Ingredient.objects.values_list(
+        'name', 'measurement_unit'
+    )) == {'Соль': 'г', 'Молоко': 'л', 'Сахар': 'г'}
+
+
+@pytest.mark.django_db
+@pytest.mark.postgres
+def test_loaded_recipes_searchable_without_vector_refresh(loaded, client):
+    run(RecipeLoader(), [
+        {**recipe_row('Омлет'), 'text': 'Пышный омлет с зеленью'},
+    ], update=True)
+    assert not Recipe.objects.filter(search_vector__isnull=True).exists()
+    response = client.get('/api/recipes/', {'search': 'зелень'})
+    assert [recipe['name'] for recipe in response.data['results']] == [
+        'Омлет'
+    ]
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from recipes.models import Favorite, Recipe, ShoppingList
+from recipes.ranking import refresh_rankings
+
+
+def scores():
+    return dict(Recipe.objects.values_list('id', 'trending_score'))
+
+
+def add_event(model, user, recipe, age):
+    event = model.objects.create(user=user, recipe=recipe)
+    model.objects.filter(id=event.id).update(
+        created=timezone.now() - timedelta(seconds=age)
+    )
+
+
+@pytest.mark.django_db
+def test_incremental_refresh_matches_full(user, author, recipes):
+    add_event(Favorite, user, recipes[0], age=3600)
+    add_event(ShoppingList, user, recipes[1], age=3600)
+    refresh_rankings()
+    add_event(Favorite, author, recipes[1], age=60)
+    add_event(Favorite, user, recipes[2], age=10)
+    refresh_rankings()
+    incremental = scores()
+    refresh_rankings(full=True)
+    assert scores() == pytest.approx(incremental)
+    assert incremental[recipes[3].id] == 0
+
+
+@pytest.mark.django_db
+def test_late_committed_event_is_counted(user, author, recipes, settings):
+    settings.RANKING_OVERLAP = 600
+    add_event(Favorite, user, recipes[0], age=60)
+    refresh_rankings()
+    # Событие создано раньше обновления, но зафиксировано после него.
+    add_event(Favorite, author, recipes[0], age=120)
+    refresh_rankings()
+    incremental = scores()
+    refresh_rankings(full=True)
+    assert scores() == pytest.approx(incremental)
+
+
+@pytest.mark.django_db
+def test_trending_ordering(client, user, recipes):
+    add_event(Favorite, user, recipes[3], age=60)
+    add_event(ShoppingList, user, recipes[5], age=60)
+    refresh_rankings()
+    response = client.get('/api/recipes/', {'ordering': 'trending'})
+    ids = [recipe['id'] for recipe in response.data['results']]
+    assert ids[:2] == [recipes[3].id, recipes[5].id]
@@ -0,0 +1,122 @@
+import pytest
+from django.conf import settings
+
+from recipes.models import Favorite, Recipe, ShoppingCartItem, ShoppingList
+
+BATCHES = pytest.mark.parametrize('path, model', (
+    ('shopping_cart', ShoppingList),
+    ('favorite', Favorite),
+))
+
+
+def batch(client, method, path, recipe_ids):
+    return getattr(client, method)(
+        f'/api/recipes/{path}/batch/', {'recipes': recipe_ids}, format='json'
+    )
+
+
+def statuses(response):
+    return [(item['id'], item['status']) for item in response.data['results']]
+
+
+@pytest.mark.django_db
+@BATCHES
+def test_batch_add_queries_do_not_depend_on_size(
+    user_client, recipes, path, model, capture_queries,
+    django_assert_num_queries,
+):
+    ids = [recipe.id for recipe in recipes]
+    with capture_queries() as context:
+        batch(user_client, 'post', path, ids[:2])
+    with django_assert_num_queries(len(context.captured_queries)):
+        response = batch(user_client, 'post', path, ids[2:])
+    assert response.status_code == 200
+    assert model.objects.count() == len(ids)
+
+
+@pytest.mark.django_db
+@BATCHES
+def test_batch_remove_queries_do_not_depend_on_size(
+    user_client, recipes, path, model, capture_queries,
+    django_assert_num_queries,
+):
+    ids = [recipe.id for recipe in recipes]
+    batch(user_client, 'post', path, ids)
+    with capture_queries() as context:
+        batch(user_client, 'delete', path, ids[:2])
+    with django_assert_num_queries(len(context.captured_queries)):
+        response = batch(user_client, 'delete', path, ids[2:-1])
+    assert response.status_code == 200
+    assert list(model.objects.values_list('recipe_id', flat=True)) == [
+        ids[-1]
+    ]
+
+
+@pytest.mark.django_db
+@BATCHES
+def test_batch_add_statuses(user, user_client, recipes, path, model):
+    first, second, third = (recipe.id for recipe in recipes[:3])
+    model.objects.create(user=user, recipe_id=third)
+    missing = Recipe.objects.order_by('id').last().id + 1
+    response = batch(
+        user_client, 'post', path, [first, missing, first, second, third]
+    )
+    assert response.status_code == 200
+    assert statuses(response) == [
+        (first, 'added'), (missing, 'not_found'), (second, 'added'),
+        (third, 'exists'),
+    ]
+    assert sorted(
+        model.objects.filter(user=user).values_list('recipe_id', flat=True)
+    ) == [first, second, third]
+
+
+@pytest.mark.django_db
+@BATCHES
+def test_batch_remove_statuses(user, user_client, recipes, path, model):
+    first, second = (recipe.id for recipe in recipes[:2])
+    model.objects.create(user=user, recipe_id=first)
+    missing = Recipe.objects.order_by('id').last().id + 1
+    response = batch(
+        user_client, 'delete', path, [first, first, second, missing]
+    )
+    assert response.status_code == 200
+    assert statuses(response) == [
+        (first, 'removed'), (second, 'not_added'), (missing, 'not_found'),
+    ]
+    assert not model.objects.filter(user=user).exists()
+
+
+@pytest.mark.django_db
+@BATCHES
+@pytest.mark.parametrize('recipe_ids', (
+    [],
+    ['one'],
+    list(range(1, settings.RECIPE_BATCH_MAX_SIZE + 2)),
+))
+def test_batch_rejects_invalid_ids(user_client, path, model, recipe_ids):
+    response = batch(user_client, 'post', path, recipe_ids)
+    assert response.status_code == 400
+    assert 'recipes' in response.data
+    assert not model.objects.exists()
+
+
+@pytest.mark.django_db
+@BATCHES
+def test_batch_requires_authentication(client, recipes, path, model):
+    response = batch(client, 'post', path, [recipes[0].id])
+    assert response.status_code == 401
+    assert not model.objects.exists()
+
+
+@pytest.mark.django_db
+def test_shopping_cart_batch_updates_cart(user, user_client, recipes):
+    ids = [recipe.id for recipe in recipes[:2]]
+    batch(user_client, 'post', 'shopping_cart', ids)
+    assert sorted(
+        ShoppingCartItem.objects.filter(user=user).values_list(
+            'amount', flat=True
+        )
+    ) == [2, 4, 6]
+    batch(user_client, 'delete', 'shopping_cart', ids)
+    assert not ShoppingCartItem.objects.filter(user=user).exists()
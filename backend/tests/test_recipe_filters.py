@@ -0,0 +1,94 @@
+import pytest
+
+from recipes.models import IngredientInRecipe
+
+
+@pytest.fixture
+def ranked_recipes(make_recipe, ingredients):
+    """Рецепты с первыми 2, 4 и 8 ингредиентами и рецепт с другими."""
+    recipes = [
+        make_recipe(f'Рецепт {count}', count=count) for count in (2, 4, 8)
+    ]
+    other = make_recipe('Другой рецепт', count=0)
+    IngredientInRecipe.objects.create(
+        recipe_parent=other, ingredient=ingredients[-1], amount=1
+    )
+    return recipes
+
+
+def search(client, ingredient_ids):
+    return client.get(
+        '/api/recipes/',
+        {'ingredients': ','.join(map(str, ingredient_ids)), 'limit': 50},
+    )
+
+
+@pytest.mark.django_db
+def test_recipes_ranked_by_ingredient_coverage(
+    user_client, ranked_recipes, ingredients
+):
+    small, medium, large = ranked_recipes
+    response = search(
+        user_client, [ingredient.id for ingredient in ingredients[:4]]
+    )
+    assert response.status_code == 200
+    assert [recipe['id'] for recipe in response.data['results']] == [
+        medium.id, small.id, large.id
+    ]
+
+
+@pytest.mark.django_db
+def test_recipe_coverage_ties_broken_by_matches(
+    client, ranked_recipes, ingredients
+):
+    small, medium, large = ranked_recipes
+    response = search(client, [ingredient.id for ingredient in ingredients])
+    assert [recipe['id'] for recipe in response.data['results']][:3] == [
+        large.id, medium.id, small.id
+    ]
+
+
+@pytest.mark.django_db
+def test_ingredient_search_queries_do_not_depend_on_ids(
+    client, ranked_recipes, ingredients, capture_queries,
+    django_assert_num_queries,
+):
+    ingredient_ids = [ingredient.id for ingredient in ingredients]
+    search(client, ingredient_ids)
+    with capture_queries() as context:
+        search(client, ingredient_ids[:1])
+    with django_assert_num_queries(len(context.captured_queries)):
+        search(client, ingredient_ids)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('value', ('1.5', 'abc', '1,2.7'))
+def test_ingredient_search_rejects_non_integer_ids(client, value):
+    response = client.get('/api/recipes/', {'ingredients': value})
+    assert response.status_code == 400
+    assert 'ingredients' in response.data
+
+
+@pytest.mark.django_db
+def test_ties_and_partial_matches_ordering(client, make_recipe, ingredients):
+    def recipe(name, *numbers):
+        recipe = make_recipe(name, count=0)
+        for number in numbers:
+            IngredientInRecipe.objects.create(
+                recipe_parent=recipe, ingredient=ingredients[number],
+                amount=1,
+            )
+        return recipe
+
+    full = recipe('Все есть', 0, 1)
+    most = recipe('Почти все', 0, 1, 2, 3)
+    half_small = recipe('Половина из двух', 2, 4)
+    half_other = recipe('Другая половина из двух', 0, 5)
+    half_large = recipe('Половина из шести', 0, 1, 2, 6, 7, 8)
+    recipe('Ничего нет', 9, 10)
+    response = search(
+        client, [ingredient.id for ingredient in ingredients[:3]]
+    )
+    assert [recipe['id'] for recipe in response.data['results']] == [
+        full.id, most.id, half_large.id, half_other.id, half_small.id
+    ]
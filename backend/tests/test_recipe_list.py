@@ -0,0 +1,41 @@
+import pytest
+
+from recipes.models import Favorite, ShoppingList
+
+PAGE_SIZE = 10
+
+
+def get_list(client):
+    response = client.get('/api/recipes/', {'limit': PAGE_SIZE})
+    assert response.status_code == 200
+    return response.data['results']
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('client_name', ('client', 'user_client'))
+def test_list_queries_do_not_depend_on_page_size(
+    request, client_name, user, make_recipe, capture_queries,
+    django_assert_max_num_queries,
+):
+    client = request.getfixturevalue(client_name)
+    recipes = [make_recipe('Рецепт 0')]
+    with capture_queries() as context:
+        assert len(get_list(client)) == 1
+    recipes += [
+        make_recipe(f'Рецепт {number}', count=number % 5)
+        for number in range(1, PAGE_SIZE)
+    ]
+    Favorite.objects.bulk_create(
+        Favorite(user=user, recipe=recipe) for recipe in recipes[::2]
+    )
+    ShoppingList.objects.bulk_create(
+        ShoppingList(user=user, recipe=recipe) for recipe in recipes[::3]
+    )
+    with django_assert_max_num_queries(len(context)):
+        results = get_list(client)
+    assert len(results) == PAGE_SIZE
+    favorited = client_name == 'user_client'
+    assert [recipe['is_favorited'] for recipe in results] == [
+        favorited and number % 2 == 0
+        for number in reversed(range(PAGE_SIZE))
+    ]
@@ -0,0 +1,51 @@
+import pytest
+
+from recipes.models import Recipe
+
+
+def search(client, text):
+    response = client.get('/api/recipes/', {'search': text})
+    assert response.status_code == 200
+    return [recipe['name'] for recipe in response.data['results']]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('text', ('борщ', 'БОРЩ', 'Борщ'))
+def test_search_ignores_case(client, make_recipe, text):
+    make_recipe('Борщ')
+    make_recipe('Суп')
+    assert search(client, text) == ['Борщ']
+
+
+@pytest.mark.django_db
+def test_name_matches_go_before_text_matches(client, make_recipe):
+    make_recipe('Окрошка')
+    make_recipe('Суп', text='Летний суп, почти окрошка')
+    make_recipe('Каша')
+    assert search(client, 'окрошка') == ['Окрошка', 'Суп']
+
+
+@pytest.mark.django_db
+@pytest.mark.postgres
+def test_search_vector_written_with_recipe(make_recipe):
+    recipe = make_recipe('Борщ')
+    assert Recipe.objects.filter(
+        pk=recipe.pk, search_vector__isnull=False
+    ).exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.postgres
+def test_search_vector_follows_updated_text(client, make_recipe):
+    recipe = make_recipe('Суп')
+    recipe.text = 'Суп с грибами'
+    recipe.save(update_fields=['text'])
+    assert search(client, 'грибы') == ['Суп']
+
+
+@pytest.mark.django_db
+@pytest.mark.postgres
+def test_search_matches_word_forms(client, make_recipe):
+    make_recipe('Блины со сметаной')
+    make_recipe('Сырники')
+    assert search(client, 'блин') == ['Блины со сметаной']
@@ -0,0 +1,112 @@
+import pytest
+
+from recipes.models import IngredientInRecipe
+
+TABLE = IngredientInRecipe._meta.db_table
+
+
+def patch_amounts(client, recipe, tag, changed_amount):
+    """PATCH рецепта, меняющий количество только первого ингредиента."""
+    lines = list(recipe.recipe_ingredients.order_by('id'))
+    ingredients = [
+        {'id': line.ingredient_id, 'amount': line.amount} for line in lines
+    ]
+    ingredients[0]['amount'] = changed_amount
+    return client.patch(
+        f'/api/recipes/{recipe.id}/',
+        {'ingredients': ingredients, 'tags': [tag.id], 'cooking_time': 10},
+        format='json',
+    )
+
+
+def writes(queries):
+    """Изменяющие запросы к таблице ингредиентов рецептов."""
+    return [
+        query['sql'] for query in queries
+        if TABLE in query['sql'] and not query['sql'].startswith('SELECT')
+    ]
+
+
+@pytest.mark.django_db
+def test_patch_changes_only_edited_line(
+    author_client, make_recipe, tag, capture_queries
+):
+    recipe = make_recipe(count=5)
+    with capture_queries() as context:
+        response = patch_amounts(author_client, recipe, tag, 42)
+    assert response.status_code == 200, response.data
+    statements = writes(context.captured_queries)
+    assert len(statements) == 1
+    assert statements[0].startswith('UPDATE')
+    assert sorted(
+        recipe.recipe_ingredients.values_list('amount', flat=True)
+    ) == [2, 3, 4, 5, 42]
+
+
+@pytest.mark.django_db
+def test_patch_without_changes_writes_nothing(
+    author_client, make_recipe, tag, capture_queries
+):
+    recipe = make_recipe(count=5)
+    with capture_queries() as context:
+        response = patch_amounts(author_client, recipe, tag, 1)
+    assert response.status_code == 200, response.data
+    assert writes(context.captured_queries) == []
+
+
+@pytest.mark.django_db
+def test_patch_queries_do_not_depend_on_ingredient_count(
+    author_client, make_recipe, tag, capture_queries,
+    django_assert_num_queries,
+):
+    small = make_recipe('Маленький рецепт', count=2)
+    large = make_recipe('Большой рецепт', count=25)
+    with capture_queries() as context:
+        patch_amounts(author_client, small, tag, 42)
+    with django_assert_num_queries(len(context.captured_queries)):
+        response = patch_amounts(author_client, large, tag, 42)
+    assert response.status_code == 200, response.data
+
+
+@pytest.mark.django_db
+def test_patch_keeps_ingredients_count(author_client, make_recipe, tag,
+                                       ingredients):
+    recipe = make_recipe(count=3)
+    response = author_client.patch(
+        f'/api/recipes/{recipe.id}/',
+        {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 1}
+                for ingredient in ingredients[1:6]
+            ],
+            'tags': [tag.id], 'cooking_time': 10,
+        },
+        format='json',
+    )
+    assert response.status_code == 200, response.data
+    recipe.refresh_from_db()
+    assert recipe.ingredients_count == 5
+
+
+@pytest.mark.django_db
+def test_duplicate_and_missing_ingredients_reported_together(
+    author_client, make_recipe, tag, ingredients
+):
+    recipe = make_recipe()
+    ingredient_id = ingredients[0].id
+    response = author_client.patch(
+        f'/api/recipes/{recipe.id}/',
+        {
+            'ingredients': [
+                {'id': pk, 'amount': 1}
+                for pk in (ingredient_id, ingredient_id, 9999)
+            ],
+            'tags': [tag.id], 'cooking_time': 10,
+        },
+        format='json',
+    )
+    assert response.status_code == 400
+    assert response.data['ingredients'] == [
+        f'Есть повторяющиеся ингредиенты: {ingredient_id}.',
+        'Не найдены ингредиенты: 9999.',
+    ]
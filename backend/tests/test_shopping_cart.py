@@ -0,0 +1,160 @@
+from threading import Thread
+
+import pytest
+from django.db import connection, transaction
+from rest_framework.test import APIClient
+
+from recipes import cart
+from recipes.models import Favorite, ShoppingCartItem, ShoppingList
+
+
+def cart_amounts(user):
+    return dict(
+        ((item.ingredient_id, item.unit), item.amount)
+        for item in ShoppingCartItem.objects.filter(user=user)
+    )
+
+
+def patch_amounts(client, recipe, tag, amount):
+    return client.patch(
+        f'/api/recipes/{recipe.id}/',
+        {
+            'ingredients': [
+                {'id': line.ingredient_id, 'amount': amount}
+                for line in recipe.recipe_ingredients.all()
+            ],
+            'tags': [tag.id], 'cooking_time': 10,
+        },
+        format='json',
+    )
+
+
+@pytest.fixture
+def locks(monkeypatch):
+    """Порядок блокировок: ('recipes' | 'users', id) в порядке вызова."""
+    calls = []
+    lock_recipes, lock_users = cart.lock_recipes, cart.lock_users
+
+    def spy_recipes(recipe_ids):
+        calls.extend(('recipes', int(pk)) for pk in recipe_ids)
+        return lock_recipes(recipe_ids)
+
+    def spy_users(user_ids):
+        calls.extend(('users', user_id) for user_id in user_ids)
+        return lock_users(user_ids)
+
+    monkeypatch.setattr(cart, 'lock_recipes', spy_recipes)
+    monkeypatch.setattr('api.views.lock_recipes', spy_recipes)
+    monkeypatch.setattr(cart, 'lock_users', spy_users)
+    return calls
+
+
+@pytest.mark.django_db
+def test_cart_add_locks_recipe_before_user(user, user_client, make_recipe,
+                                           locks):
+    recipe = make_recipe()
+    response = user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+    assert response.status_code == 201
+    assert locks[0] == ('recipes', recipe.id)
+    assert locks[-1] == ('users', user.id)
+
+
+@pytest.mark.django_db
+def test_recipe_update_locks_recipe_before_users(user, user_client,
+                                                 author_client, make_recipe,
+                                                 tag, locks):
+    recipe = make_recipe()
+    user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+    locks.clear()
+    assert patch_amounts(author_client, recipe, tag, 7).status_code == 200
+    assert locks == [('recipes', recipe.id), ('users', user.id)]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_cart_follows_recipe_update(user, user_client, author_client,
+                                    make_recipe, tag):
+    recipe = make_recipe()
+    user_client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+    assert patch_amounts(author_client, recipe, tag, 7).status_code == 200
+    assert cart_amounts(user) == cart.get_recipe_amounts([recipe.id])
+    user_client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+    assert cart_amounts(user) == {}
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.postgres
+def test_cart_add_waits_for_recipe_update(user, author_client, make_recipe,
+                                          tag):
+    recipe = make_recipe()
+    responses = []
+
+    def add_to_cart():
+        client = APIClient()
+        client.force_authenticate(user)
+        try:
+            responses.append(
+                client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+            )
+        finally:
+            connection.close()
+
+    thread = Thread(target=add_to_cart)
+    with transaction.atomic():
+        cart.lock_recipes([recipe.id])
+        thread.start()
+        thread.join(0.5)
+        assert thread.is_alive()
+        assert patch_amounts(author_client, recipe, tag, 7).status_code == 200
+    thread.join()
+    assert responses[0].status_code == 201
+    assert cart_amounts(user) == cart.get_recipe_amounts([recipe.id])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('action, model', (
+    ('shopping_cart', ShoppingList), ('favorite', Favorite),
+))
+def test_repeated_add_and_remove_rejected(user_client, make_recipe, action,
+                                          model):
+    url = f'/api/recipes/{make_recipe().id}/{action}/'
+    assert user_client.post(url).status_code == 201
+    assert user_client.post(url).status_code == 400
+    assert user_client.delete(url).status_code == 204
+    assert user_client.delete(url).status_code == 400
+    assert not model.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('action, model', (
+    ('shopping_cart', ShoppingList), ('favorite', Favorite),
+))
+def test_missing_recipe_not_found(user_client, action, model):
+    """
+    Внешний ключ проверяется при коммите, поэтому тест без обёртки в
+    транзакцию, как и запрос.
+    """
+    url = f'/api/recipes/9999/{action}/'
+    assert user_client.post(url).status_code == 404
+    assert user_client.delete(url).status_code == 404
+    assert not model.objects.exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('action, model', (
+    ('shopping_cart', ShoppingList), ('favorite', Favorite),
+))
+def test_remove_is_single_delete(user, user_client, make_recipe,
+                                 capture_queries, action, model):
+    recipe = make_recipe()
+    url = f'/api/recipes/{recipe.id}/{action}/'
+    user_client.post(url)
+    with capture_queries() as context:
+        assert user_client.delete(url).status_code == 204
+    table = model._meta.db_table
+    assert [
+        query['sql'].split()[0] for query in context.captured_queries
+        if f'"{table}"' in query['sql']
+    ] == ['DELETE']
+    recipe.refresh_from_db()
+    assert recipe.favorites_count == 0
+    assert cart_amounts(user) == {}
@@ -0,0 +1,43 @@
+import pytest
+
+from recipes.models import ShoppingList
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+@pytest.fixture
+def cart(user, recipes):
+    ShoppingList.objects.create(user=user, recipe=recipes[0])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params, status', (
+    ({}, 401),
+    ({'format': 'pdf'}, 401),
+))
+def test_anonymous_download_errors_are_json(client, params, status):
+    response = client.get(URL, params)
+    assert response.status_code == status
+    assert response['Content-Type'] == 'application/json'
+    assert 'detail' in response.json()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('params, status', (
+    ({'units': 'miles'}, 400),
+    ({'format': 'pdf', 'units': 'miles'}, 400),
+    ({'format': 'xml'}, 404),
+))
+def test_download_errors_are_json(user_client, cart, params, status):
+    response = user_client.get(URL, params)
+    assert response.status_code == status
+    assert response['Content-Type'] == 'application/json'
+    response.json()
+
+
+@pytest.mark.django_db
+def test_download_text(user_client, cart):
+    response = user_client.get(URL, {'format': 'txt'})
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/plain')
+    assert 'Ингредиент 0' in b''.join(response.streaming_content).decode()
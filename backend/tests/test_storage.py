@@ -0,0 +1,28 @@
+import os
+
+from django.core.files.base import ContentFile
+
+from recipes.storage import recipe_image_storage
+
+
+def test_same_content_is_stored_once():
+    first = recipe_image_storage.save('recipes/images/a.png', ContentFile(
+        b'image'
+    ))
+    second = recipe_image_storage.save('recipes/images/b.PNG', ContentFile(
+        b'image'
+    ))
+    assert first == second
+    assert first.endswith('.png')
+
+
+def test_reused_file_is_touched():
+    name = recipe_image_storage.save(
+        'recipes/images/old.png', ContentFile(b'old image')
+    )
+    path = recipe_image_storage.path(name)
+    os.utime(path, (0, 0))
+    assert recipe_image_storage.save(
+        'recipes/images/new.png', ContentFile(b'old image')
+    ) == name
+    assert os.path.getmtime(path) > 0
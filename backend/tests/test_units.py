@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+import pytest
+
+from recipes import units
+
+
+@pytest.mark.parametrize('amount, unit, ingredient_unit, expected', (
+    (Decimal('1.5'), 'кг', 'г', (Decimal(1500), 'г')),
+    (Decimal(250), 'г', 'кг', (Decimal(250), 'г')),
+    (Decimal(2), 'ст. л.', 'мл', (Decimal(30), 'мл')),
+    (Decimal(3), '', 'шт.', (Decimal(3), 'шт.')),
+    (Decimal(1), 'щепотка', 'г', (Decimal(1), 'щепотка')),
+))
+def test_to_base(amount, unit, ingredient_unit, expected):
+    assert units.to_base(amount, unit, ingredient_unit) == expected
+
+
+def test_glass_converted_to_mass_by_density():
+    assert units.to_base(
+        Decimal(1), 'стакан', 'г', density=Decimal('0.6')
+    ) == (Decimal(150), 'г')
+    assert units.to_base(
+        Decimal(300), 'г', 'мл', density=Decimal('1.2')
+    ) == (Decimal(250), 'мл')
+
+
+@pytest.mark.parametrize('amount, mode, expected', (
+    (Decimal(1500), units.DISPLAY_INGREDIENT, (Decimal('1.5'), 'кг')),
+    (Decimal(1500), units.DISPLAY_BASE, (Decimal(1500), 'г')),
+    (Decimal(1500), units.DISPLAY_AUTO, (Decimal('1.5'), 'кг')),
+    (Decimal(500), units.DISPLAY_AUTO, (Decimal(500), 'г')),
+))
+def test_to_display(amount, mode, expected):
+    assert units.to_display(amount, 'г', 'кг', mode) == expected
+
+
+@pytest.mark.parametrize('name, expected', (
+    ('гр.', 'г'),
+    (' ст.л. ', 'ст. л.'),
+    ('ч.  л.', 'ч. л.'),
+    ('пучок', 'пучок'),
+))
+def test_unit_names_normalized(name, expected):
+    assert units.get_unit(name).name == expected
+
+
+@pytest.mark.parametrize('unit, ingredient_unit, density, expected', (
+    ('кг', 'г', None, True),
+    ('стакан', 'г', None, False),
+    ('стакан', 'г', Decimal('0.6'), True),
+    ('шт.', 'г', Decimal('0.6'), False),
+    ('щепотка', 'г', None, False),
+))
+def test_is_convertible(unit, ingredient_unit, density, expected):
+    assert units.is_convertible(unit, ingredient_unit, density) is expected
+
+
+@pytest.mark.django_db
+def test_mismatched_unit_rejected(author_client, make_recipe, tag,
+                                  ingredients):
+    recipe = make_recipe(count=1)
+    response = author_client.patch(
+        f'/api/recipes/{recipe.id}/',
+        {
+            'ingredients': [
+                {'id': ingredients[0].id, 'amount': 1, 'unit': 'стакан'}
+            ],
+            'tags': [tag.id], 'cooking_time': 10,
+        },
+        format='json',
+    )
+    assert response.status_code == 400
+    assert 'Ингредиент 0 (стакан)' in str(response.data['ingredients'])
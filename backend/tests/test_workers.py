@@ -0,0 +1,47 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+from queue import Queue
+
+import pytest
+
+from api import workers
+
+TIMEOUT = 30
+
+
+@pytest.fixture(autouse=True)
+def executor():
+    yield
+    if workers._executor is not None:
+        workers.reset_executor(workers._executor)
+
+
+def run(func, *args, on_success=None):
+    results = Queue()
+    workers.submit(
+        func, *args,
+        on_success=on_success or results.put,
+        on_error=lambda error: results.put(error),
+    )
+    return results.get(timeout=TIMEOUT)
+
+
+def test_submit_passes_result():
+    assert run(pow, 2, 10) == 1024
+
+
+def test_submit_reports_errors_of_on_success():
+    def on_success(result):
+        raise ValueError(result)
+
+    error = run(pow, 2, 10, on_success=on_success)
+    assert isinstance(error, ValueError)
+    assert error.args == (1024,)
+
+
+def test_submit_replaces_broken_pool():
+    broken = workers.get_executor()
+    crash = broken.submit(os._exit, 1)
+    assert isinstance(crash.exception(timeout=TIMEOUT), BrokenProcessPool)
+    assert run(pow, 2, 10) == 1024
+    assert workers.get_executor() is not broken
@@ -14,6 +14,8 @@ class UserAdmin(UserAdmin):
         'email',
         'first_name',
         'last_name',
+        'recipes_count',
+        'followers_count',
     )
     empty_value_display = 'Значение отсутствует'
     list_filter = ('username', 'email')
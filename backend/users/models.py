@@ -39,6 +39,16 @@ class User(AbstractUser):
         'self', through='Follow', symmetrical=False,
         through_fields=('user', 'author')
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Кол-во рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Кол-во подписчиков',
+        default=0,
+        editable=False,
+    )
 
     objects = UserManager()
 